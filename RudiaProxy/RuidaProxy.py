@@ -31,14 +31,19 @@
 # 2020-02-18, v0.1, jw  - initial draught.
 # 2020-02-19, v0.2, jw  - descrambling added, but unused. We find the FIN_RAW packet as is.
 # 2022-01-17, v0.3, jw  - debugging added with hexdump
+# 2026-10-18, v0.4, agent  - unscramble via the shared tables in ../src/ruidacodec.py
 
 
-__version__ = "0.3"
+__version__ = "0.4"
 
 
 import os, sys, time, select
 from socket import *
 
+# ruidacodec.py lives in ../src of this checkout. realpath, in case we are called via a symlink.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'src'))
+import ruidacodec
+
 INADDR_ANY_DOTTED = '0.0.0.0'   # bind to all interfaces.
 BUSY_TIMEOUT = 10.000           # seconds. A pause that long ends a UDP Stream.
 
@@ -81,22 +86,11 @@ class RuidaProxyServer():
 
   def unscramble(self, b):
     """ unscramble a single byte for reading from *.rd files """
-    res_b=b-1
-    if res_b<0: res_b+=0x100
-    res_b^=0x88
-    fb=res_b&0x80
-    lb=res_b&1
-    res_b=res_b-fb-lb
-    res_b|=lb<<7
-    res_b|=fb>>7
-    return res_b
+    return ruidacodec.unscramble(b)
 
 
   def unscramble_bytes(self, data):
-    if sys.version_info.major < 3:
-      return bytes([self.unscramble(ord(b)) for b in data])
-    else:
-      return bytes([self.unscramble(b) for b in data])
+    return ruidacodec.unscramble_bytes(data)
 
 
   def check_checksum(self, data):
@@ -11,6 +11,7 @@ from __future__ import print_function
 
 import socket, sys
 from ruidaparser import RuidaParser
+from ruidacodec import unscramble_bytes
 
 #ip_addr = '192.168.2.21'                # falafue
 #ip_addr = '172.22.30.50'                # fablabnbg
@@ -18,24 +19,6 @@ ip_addr = '127.0.0.123'                 # RuidaDummy
 server_port = 50200
 mtu = 1470
 
-def unscramble(b):
-    """ unscramble a single byte for reading from *.rd files """
-    res_b=b-1
-    if res_b<0: res_b+=0x100
-    res_b^=0x88
-    fb=res_b&0x80
-    lb=res_b&1
-    res_b=res_b-fb-lb
-    res_b|=lb<<7
-    res_b|=fb>>7
-    return res_b
-
-def unscramble_bytes(data):
-    if sys.version_info.major < 3:
-      return bytes([unscramble(ord(b)) for b in data])
-    else:
-      return bytes([unscramble(b) for b in data])
-
 def check_checksum(data):
   sum = 0
   for i in bytes(data[2:]):
@@ -67,11 +50,10 @@ while True:
       print("bad checksum in %s from %s" % (data, addr))
       sock.sendto(b'\x46', addr)     # reply 0x46=NACK
     else:
-      # r.decode(buf, debug=True)         # easily explodes with: "IndexError: index out of range" line 95, decode_relcoord(): r = (x[0] << 7) + x[1]
+      # r.decode(buf) would explode with IndexError, packets may end inside a command. feed() keeps the rest.
       buf = unscramble_bytes(buf)
-      for c in buf:
-        print("%02X " % c, end='')
-      print()
+      for offset, data, name, msg in r.feed(buf):
+        print("%7d: %-32s %s %s" % (offset, " ".join(["%02x" % c for c in data[:10]]), name, msg or ""))
       # print("Seen: %s from %s" % (buf, addr))
       sock.sendto(b'\xc6', addr)     # reply 0xc6=ACK
 
@@ -0,0 +1,273 @@
+#! /usr/bin/python3
+#
+# rd2png.py -- render a ruida .rd file into a png preview.
+#
+# Cuts are drawn in the color of their layer, moves optionally in a dim
+# travel color. All segments are rasterized at once with numpy: each
+# segment is clipped to the image, sampled at one point per pixel step,
+# and the samples are written into the image by fancy indexing.
+# The png is written with zlib, no imaging library is needed.
+#
+# With --tiles, a tile pyramid DIR/z/x/y.png is written instead, as used by
+# web map viewers: level 0 is the whole job in one tile, each level doubles
+# the resolution. Only the segments touching a tile are drawn into it, see
+# tiles(). Empty tiles are not written.
+#
+# Usage: python3 rd2png.py FILE.rd [-o FILE.png] [--size 1024] [--travel]
+#        python3 rd2png.py FILE.rd --tiles DIR [--levels 4] [--tile-size 256]
+#
+# 2026-10-18, v1.0, agent:    Initial version.
+#
+# The code is fully compatible with python 2.7 and 3.5
+#
+import os, zlib, struct, argparse
+from ruidaparser import RuidaParser
+
+try:
+  import numpy          # required. Everything here is vectorized.
+except ImportError:
+  numpy = None
+
+BACKGROUND = (255, 255, 255)
+CUT_COLOR = (0, 0, 255)         # for layers without a color, as in RuidaParser.to_svg()
+TRAVEL_COLOR = (200, 200, 200)
+CHUNK = 1 << 20                 # samples drawn at once, bounds the memory of draw()
+EPS = 1e-6                      # in pixels, see draw()
+MARGIN = 1e-3                   # in pixels, more than EPS, see tiles()
+
+
+def parse_color(color, default=CUT_COLOR):
+  """ '#rrggbb' as an (r, g, b) tuple """
+  if not color: return default
+  v = int(color.lstrip('#'), 16)
+  return ((v >> 16) & 0xff, (v >> 8) & 0xff, v & 0xff)
+
+
+def segments(parser, travel=False, travel_color=TRAVEL_COLOR):
+  """
+  Returns (seg, rgb) for the paths of a decoded RuidaParser:
+  seg is a numpy array of shape (S, 4), x0, y0, x1, y1 in mm of each line
+  segment, rgb an array of shape (S, 3), its color. A cut has the color of
+  its layer. With travel=True, the moves are included first, so that cuts
+  are drawn over them.
+  """
+  if numpy is None: raise ImportError("rd2png needs numpy")
+  c = parser.columns()
+  xy = c['xy']
+  if len(xy) < 2: return numpy.zeros((0, 4)), numpy.zeros((0, 3), dtype=numpy.uint8)
+  seg = numpy.concatenate([xy[:-1], xy[1:]], axis=1)
+  cut = c['cut'][1:]
+
+  # color of each layer, then of each path, then of each vertex.
+  layers, inverse = numpy.unique(c['layer'], return_inverse=True)
+  palette = numpy.array([parse_color((parser._layer.get(int(n)) or {}).get('color')) for n in layers], dtype=numpy.uint8)
+  count = numpy.diff(numpy.append(c['offsets'], len(xy)))
+  rgb = palette[numpy.repeat(inverse.reshape(-1), count)][1:]
+
+  if not travel: return seg[cut], rgb[cut]
+  moves = ~cut
+  rgb[moves] = travel_color
+  return numpy.concatenate([seg[moves], seg[cut]]), numpy.concatenate([rgb[moves], rgb[cut]])
+
+
+def clip(px, width, height):
+  """
+  Liang-Barsky clipping of pixel coordinate segments (S, 4) to the image
+  [0, width) x [0, height). Returns (t0, t1, keep): the visible part of
+  each segment kept is from t0 to t1, as a fraction of its length.
+  """
+  x0, y0, x1, y1 = px.T
+  dx = x1 - x0
+  dy = y1 - y0
+  t0 = numpy.zeros(len(px))
+  t1 = numpy.ones(len(px))
+  outside = numpy.zeros(len(px), dtype=bool)
+  xmax = width - 1e-6
+  ymax = height - 1e-6
+  with numpy.errstate(divide='ignore', invalid='ignore'):
+    for p, q in ((-dx, x0), (dx, xmax - x0), (-dy, y0), (dy, ymax - y0)):
+      r = q / p
+      t0 = numpy.where(p < 0, numpy.maximum(t0, r), t0)
+      t1 = numpy.where(p > 0, numpy.minimum(t1, r), t1)
+      outside |= (p == 0) & (q < 0)
+  keep = numpy.nonzero(~outside & (t0 <= t1))[0]
+  return t0[keep], t1[keep], keep
+
+
+def draw(image, seg, rgb, origin=(0, 0), scale=1.0):
+  """
+  Draws the segments (S, 4) in mm with colors rgb (S, 3) into image, a
+  numpy array of shape (height, width, 3). origin is the position in mm of
+  the top left corner of the image, scale in pixels per mm. Lines are one
+  pixel wide. Later segments are drawn over earlier ones.
+
+  A segment is sampled at one point per pixel step along its longer axis.
+  Only the samples inside the image are computed, on the same grid as
+  without clipping, so that the tiles of tiles() match a single image.
+  """
+  height, width = image.shape[:2]
+  if not len(seg): return image
+  px = (seg - numpy.array([origin[0], origin[1], origin[0], origin[1]])) * scale
+  t0, t1, keep = clip(px, width, height)
+  px = px[keep]
+  x0 = px[:, 0]
+  y0 = px[:, 1]
+  dx = px[:, 2] - x0
+  dy = px[:, 3] - y0
+  steps = numpy.maximum(numpy.ceil(numpy.maximum(numpy.abs(dx), numpy.abs(dy))), 1)
+  # samples fall on whole pixel coordinates, EPS keeps rounding errors from truncating them to the pixel below.
+  k0 = numpy.ceil(t0 * steps - EPS).astype(numpy.int64)
+  m = numpy.maximum(numpy.floor(t1 * steps + EPS).astype(numpy.int64) - k0 + 1, 0)
+
+  # one color id per pixel, -1 is background. Colors are set at the end.
+  palette, cid = numpy.unique(rgb[keep], axis=0, return_inverse=True)
+  cid = cid.reshape(-1).astype(numpy.int16)
+  canvas = numpy.full(height * width, -1, dtype=numpy.int16)
+  ends = numpy.cumsum(m)
+  start = 0
+  while start < len(m):
+    # the segments of one chunk of samples, at least one segment.
+    stop = max(int(numpy.searchsorted(ends, ends[start] - m[start] + CHUNK, side='right')), start + 1)
+    mc = m[start:stop]
+    k = numpy.arange(int(mc.sum())) - numpy.repeat(numpy.cumsum(mc) - mc - k0[start:stop], mc)
+    t = k / numpy.repeat(steps[start:stop], mc)
+    x = (numpy.repeat(x0[start:stop], mc) + numpy.repeat(dx[start:stop], mc) * t + EPS).astype(numpy.int64)
+    y = (numpy.repeat(y0[start:stop], mc) + numpy.repeat(dy[start:stop], mc) * t + EPS).astype(numpy.int64)
+    canvas[numpy.clip(y, 0, height - 1) * width + numpy.clip(x, 0, width - 1)] = numpy.repeat(cid[start:stop], mc)
+    start = stop
+  ink = canvas >= 0
+  image.reshape(-1, 3)[ink] = palette[canvas[ink]]
+  return image
+
+
+def bounds(seg):
+  """ [[xmin, ymin], [xmax, ymax]] of the segments in mm """
+  xy = seg.reshape(-1, 2)
+  return [xy.min(axis=0).tolist(), xy.max(axis=0).tolist()]
+
+
+def new_image(width, height, background=BACKGROUND):
+  image = numpy.empty((height, width, 3), dtype=numpy.uint8)
+  image[0] = background
+  image[1:] = image[0]          # row by row, much faster than the color into each pixel
+  return image
+
+
+def render(seg, rgb, size=1024, background=BACKGROUND):
+  """
+  Renders all segments into one image, the longer side of their bounding
+  box becomes size pixels. Returns the image as a numpy array.
+  """
+  if not len(seg): return new_image(1, 1, background)
+  (x0, y0), (x1, y1) = bounds(seg)
+  scale = (size - 1) / max(x1 - x0, y1 - y0, 1e-3)
+  image = new_image(int((x1 - x0) * scale) + 1, int((y1 - y0) * scale) + 1, background)
+  return draw(image, seg, rgb, (x0, y0), scale)
+
+
+def tiles(seg, rgb, level, tile=256, background=BACKGROUND):
+  """
+  Yields (tx, ty, image) for each tile of a pyramid level that is touched
+  by a segment. At level 0, the bounding box of all segments fits into one
+  tile, each level doubles the resolution. The segments are assigned to
+  the tiles they cross, row by row, so that each tile only draws its own.
+  """
+  if not len(seg): return
+  (x0, y0), (x1, y1) = bounds(seg)
+  scale = (tile * (1 << level) - 1) / max(x1 - x0, y1 - y0, 1e-3)
+  ntx = int((x1 - x0) * scale) // tile + 1
+  nty = int((y1 - y0) * scale) // tile + 1
+  px = (seg - numpy.array([x0, y0, x0, y0])) * scale
+  ty0 = (numpy.minimum(px[:, 1], px[:, 3]) // tile).astype(numpy.int64)
+  ty1 = numpy.minimum((numpy.maximum(px[:, 1], px[:, 3]) // tile).astype(numpy.int64), nty - 1)
+
+  # one entry per (segment, tile row) pair, for the rows its bounding box spans.
+  h = ty1 - ty0 + 1
+  idx = numpy.repeat(numpy.arange(len(seg)), h)
+  ty = numpy.repeat(ty0, h) + numpy.arange(len(idx)) - numpy.repeat(numpy.cumsum(h) - h, h)
+
+  # the part of the segment within the row gives its tiles in x, with a margin for the
+  # rounding in draw(). Thus a long diagonal only gets the tiles along its way, not all
+  # of its bounding box.
+  sx0, sy0, sx1, sy1 = px[idx].T
+  dy = sy1 - sy0
+  with numpy.errstate(divide='ignore', invalid='ignore'):
+    ta = (ty * tile - MARGIN - sy0) / dy
+    tb = ((ty + 1) * tile + MARGIN - sy0) / dy
+  flat = dy == 0
+  lo = numpy.where(flat, 0.0, numpy.clip(numpy.minimum(ta, tb), 0.0, 1.0))
+  hi = numpy.where(flat, 1.0, numpy.clip(numpy.maximum(ta, tb), 0.0, 1.0))
+  xa = sx0 + (sx1 - sx0) * lo
+  xb = sx0 + (sx1 - sx0) * hi
+  rx0 = numpy.maximum((numpy.minimum(xa, xb) - MARGIN) // tile, 0).astype(numpy.int64)
+  rx1 = numpy.minimum((numpy.maximum(xa, xb) + MARGIN) // tile, ntx - 1).astype(numpy.int64)
+
+  # one entry per (segment, tile) pair, in drawing order within each tile.
+  w = numpy.maximum(rx1 - rx0 + 1, 0)
+  k = numpy.arange(int(w.sum())) - numpy.repeat(numpy.cumsum(w) - w, w)
+  key = numpy.repeat(ty * ntx + rx0, w) + k
+  idx = numpy.repeat(idx, w)
+  order = numpy.argsort(key, kind='mergesort')
+  key = key[order]
+  idx = idx[order]
+  first = numpy.nonzero(numpy.diff(key, prepend=-1))[0]
+  last = numpy.append(first[1:], len(key))
+  for a, b in zip(first, last):
+    ty, tx = divmod(int(key[a]), ntx)
+    sub = idx[a:b]
+    image = new_image(tile, tile, background)
+    draw(image, seg[sub], rgb[sub], (x0 + tx * tile / scale, y0 + ty * tile / scale), scale)
+    yield tx, ty, image
+
+
+def write_png(fd, image, rle=False):
+  """
+  Writes an (height, width, 3) uint8 image as an 8 bit RGB png into the
+  binary file fd. rle=True compresses twice as fast, for the many small,
+  mostly blank tiles of tiles(). Large images get larger with it.
+  """
+  height, width = image.shape[:2]
+  raw = numpy.zeros((height, width * 3 + 1), dtype=numpy.uint8)     # filter type 0 in front of each row
+  raw[:, 1:] = image.reshape(height, width * 3)
+
+  def chunk(kind, data):
+    fd.write(struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff))
+
+  fd.write(b'\x89PNG\r\n\x1a\n')
+  chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+  strategy = zlib.Z_DEFAULT_STRATEGY
+  if rle: strategy = getattr(zlib, 'Z_RLE', strategy)
+  z = zlib.compressobj(6, zlib.DEFLATED, 15, 8, strategy)
+  chunk(b'IDAT', z.compress(raw.tobytes()) + z.flush())
+  chunk(b'IEND', b'')
+
+
+if __name__ == '__main__':
+  ap = argparse.ArgumentParser(description="render a ruida .rd file into a png preview.")
+  ap.add_argument('file', help="the .rd file")
+  ap.add_argument('-o', '--output', help="png file, default: FILE.png")
+  ap.add_argument('--size', type=int, default=1024, help="pixels of the longer side, default: %(default)s")
+  ap.add_argument('--travel', action='store_true', help="also draw the moves")
+  ap.add_argument('--travel-color', default='#c8c8c8', help="color of the moves, default: %(default)s")
+  ap.add_argument('--tiles', metavar='DIR', help="write a tile pyramid DIR/z/x/y.png instead")
+  ap.add_argument('--levels', type=int, default=4, help="zoom levels of the tile pyramid, default: %(default)s")
+  ap.add_argument('--tile-size', type=int, default=256, help="default: %(default)s")
+  args = ap.parse_args()
+
+  with RuidaParser(file=args.file, lazy=True) as r:
+    r.decode(columns=True)
+  seg, rgb = segments(r, travel=args.travel, travel_color=parse_color(args.travel_color))
+
+  if args.tiles:
+    for z in range(args.levels):
+      n = 0
+      for tx, ty, image in tiles(seg, rgb, z, args.tile_size):
+        d = os.path.join(args.tiles, str(z), str(tx))
+        if not os.path.isdir(d): os.makedirs(d)
+        with open(os.path.join(d, "%d.png" % ty), 'wb') as fd: write_png(fd, image, rle=True)
+        n += 1
+      print("level %d: %d tiles" % (z, n))
+  else:
+    output = args.output or os.path.splitext(args.file)[0] + '.png'
+    with open(output, 'wb') as fd: write_png(fd, render(seg, rgb, args.size))
+    print("%s: %d segments" % (output, len(seg)))
@@ -10,17 +10,37 @@
 # 2022-02-07, v0.2, jw:       Commands added, parameter decoding wip.
 # 2022-02-08, v0.3, jw:       Add layer info to paths.
 # 2022-02-08, v1.0, jw:       Can convert square_tri_test.rd into a nice svg.
+# 2026-10-18, v1.1, agent:    The svg is streamed, see RuidaParser.write_svg(). The file is mapped
+#                             and decoded into flat arrays, the disassembly only with --debug.
+#                             Options --output, --precision, --preview.
 #
-import sys
+import sys, argparse
 from ruidaparser import RuidaParser
 
-r = RuidaParser(file=sys.argv[1])
-r.decode(debug=True)
-print(r.to_svg(stroke_width=0.1))
+ap = argparse.ArgumentParser(description="convert a ruida .rd file into svg.")
+ap.add_argument('file', help="the .rd file")
+ap.add_argument('-o', '--output', help="svg file, default: stdout")
+ap.add_argument('--stroke-width', type=float, default=0.1, help="default: %(default)s")
+ap.add_argument('--precision', type=int, default=10, help="decimals of the coordinates in mm, default: %(default)s. 3 (micrometers) gives smaller files")
+ap.add_argument('--preview', type=int, metavar='PIXELS', help="drop vertices closer than a pixel, for a preview of this many pixels width or height")
+ap.add_argument('--debug', action='store_true', help="print a disassembly to stderr")
+args = ap.parse_args()
+
+with RuidaParser(file=args.file, lazy=True) as r:
+  if args.debug: r.decode(debug=True)
+  else:          r.decode(columns=True)
+
+tolerance = None
+if args.preview:
+  tolerance = max(r._bbox[2]-r._bbox[0], r._bbox[3]-r._bbox[1]) / args.preview
+  if tolerance <= 0: tolerance = None     # no bounding box in the header
+
+fd = open(args.output, 'w') if args.output else sys.stdout
+r.write_svg(fd, stroke_width=args.stroke_width, precision=args.precision, tolerance=tolerance)
+if args.output: fd.close()
 
 if False:
   from pprint import pprint
   pprint({ 'p':r._paths, 'bbox':r._bbox, 'las':r._laser}, depth=5, stream=sys.stderr)
 
 ###
-
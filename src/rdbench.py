@@ -0,0 +1,292 @@
+#! /usr/bin/python3
+#
+# rdbench.py -- benchmarks for the encoder, the parser and the udp chunker.
+#
+# Measures Ruida.write(), scramble_bytes(), RuidaParser.decode(),
+# RuidaParser.to_svg() and RuidaUdp.write() on the example-files/*.rd and on
+# seeded synthetic jobs, see synthetic_job(). Reports the best time of some
+# repeats as vertices/s and MB/s, and the peak memory of one extra run
+# under tracemalloc.
+#
+# With --save, the results are stored as the baseline. Otherwise they are
+# compared with the baseline, if there is one, and the exit code is 1 if a
+# benchmark got slower or needs more memory than the threshold allows, or
+# is missing in the baseline.
+# The baseline holds absolute timings, it is only meaningful on the machine
+# where it was saved. Thus it is not part of the repository: save one on your
+# machine before a change, with the same options as the later runs.
+#
+# Usage: python3 rdbench.py [--sizes 1k,10k,100k,1M] [--save] [--baseline FILE]
+#   e.g. python3 rdbench.py --save; (change the code); python3 rdbench.py
+#
+# 2026-10-18, v1.0, agent:    Initial version.
+# 2026-10-18, v1.1, agent:    decode_geometry benchmark.
+# 2026-10-18, v1.2, agent:    decode_columns benchmark.
+#
+# The code is fully compatible with python 2.7 and 3.5
+#
+from __future__ import print_function
+import sys, os, io, glob, json, time, threading, platform, argparse
+import socket
+from ruida import Ruida, RuidaPathArray, RuidaPathStore
+from ruidaparser import RuidaParser
+from udpsendruida import RuidaUdp
+import ruidacodec
+
+try:
+  import numpy          # required for synthetic_job()
+except ImportError:
+  numpy = None
+
+try:
+  import tracemalloc    # python 3.4+. Without it, no peak memory is reported.
+except ImportError:
+  tracemalloc = None
+
+__version__ = "1.2"
+
+timer = getattr(time, 'perf_counter', time.time)
+here = os.path.dirname(os.path.abspath(__file__))
+BASELINE = os.path.join(here, 'rdbench_baseline.json')
+EXAMPLES = os.path.join(here, '..', 'example-files')
+
+
+def parse_size(s):
+  """ '10k' -> 10000, '1M' -> 1000000 """
+  mult = {'k': 1000, 'K': 1000, 'm': 1000000, 'M': 1000000}
+  if s[-1] in mult: return int(float(s[:-1]) * mult[s[-1]])
+  return int(s)
+
+
+def synthetic_job(vertices, layers=1, rel=0.9, seed=1, kind='array', pathlen=50, size=(600.0, 400.0)):
+  """
+  Returns a list of layers, each a list of paths, with vertices in total.
+
+  A fraction rel of all steps is short enough (at most 5 mm per axis) for a
+  relative move or cut, the others jump to a random position on the bed of
+  the given size in mm. Path lengths are random, pathlen on average.
+  Coordinates are on the micrometer grid. The same seed gives the same job.
+
+  kind selects the representation of the paths: 'list' for nested lists,
+  'array' for RuidaPathArray or 'store' for RuidaPathStore.
+  """
+  if numpy is None: raise ImportError("synthetic_job needs numpy")
+  if kind not in ('list', 'array', 'store'): raise ValueError("unknown kind '%s'" % kind)
+  rng = numpy.random.RandomState(seed)
+  lengths = rng.randint(2, 2 * pathlen - 1, size=vertices // pathlen + 2)
+  while lengths.sum() < vertices:
+    lengths = numpy.concatenate([lengths, rng.randint(2, 2 * pathlen - 1, size=len(lengths))])
+  offsets = numpy.concatenate([[0], numpy.cumsum(lengths)])
+  offsets = offsets[offsets < vertices]
+
+  # walk with small steps, restarted at each jump, and folded back onto the bed.
+  jump = rng.random_sample(vertices) >= rel
+  jump[0] = True
+  step = rng.uniform(-5.0, 5.0, size=(vertices, 2))
+  start = numpy.nonzero(jump)[0]
+  group = numpy.cumsum(jump) - 1
+  walk = numpy.cumsum(step, axis=0)
+  base = rng.uniform(0.0, 1.0, size=(len(start), 2)) * size
+  xy = base[group] + walk - walk[start][group]
+  span = 2 * numpy.asarray(size)
+  xy = numpy.mod(xy, span)
+  xy = numpy.where(xy > span / 2, span - xy, xy)
+  um = numpy.rint(xy * 1000).astype(numpy.int64)
+
+  job = []
+  npaths = len(offsets)
+  bounds = [offsets[(npaths * i) // layers] if i < layers else vertices for i in range(layers + 1)]
+  for i in range(layers):
+    a, b = int(bounds[i]), int(bounds[i+1])
+    o = offsets[(offsets >= a) & (offsets < b)] - a
+    if kind == 'store':
+      job.append(RuidaPathStore.from_microns(um[a:b], o))
+    else:
+      pa = RuidaPathArray(um[a:b] / 1000.0, o)
+      job.append(pa if kind == 'array' else [p.tolist() for p in pa])
+  return job
+
+
+def synthetic_ruida(job):
+  """ a Ruida object with one layer per entry of job, as from synthetic_job(). """
+  rd = Ruida()
+  rd.set(nlayers=len(job))
+  for i, paths in enumerate(job):
+    rd.set(layer=i, paths=paths, speed=[200, 30], power=[10+i%50, 40], color=[(i*80)%256, 255-(i*50)%256, 7])
+  return rd
+
+
+def count_vertices(parser):
+  return sum([len(p['data']) for p in parser._paths])
+
+
+def measure(func, setup=None, repeat=3, memory=True):
+  """
+  Runs func(setup()) repeat times and returns the best time in seconds, and
+  the peak memory in bytes of one more run traced by tracemalloc, or None.
+  The setup is not measured.
+  """
+  best = None
+  for i in range(repeat):
+    arg = setup() if setup else None
+    t = timer()
+    func(arg)
+    t = timer() - t
+    if best is None or t < best: best = t
+  peak = None
+  if memory and tracemalloc is not None:
+    arg = setup() if setup else None
+    tracemalloc.start()
+    func(arg)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+  return best, peak
+
+
+class AckServer(threading.Thread):
+  """ answers each datagram on a loopback port with an ACK, like the controller. """
+  def __init__(self):
+    threading.Thread.__init__(self)
+    self.daemon = True
+    self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    self.sock.bind(('127.0.0.1', 0))
+    self.port = self.sock.getsockname()[1]
+    self.received = 0
+
+  def run(self):
+    while True:
+      data, addr = self.sock.recvfrom(0x10000)
+      self.received += len(data)
+      self.sock.sendto(b'\xc6', addr)
+
+
+class Bench():
+  """ collects results as {name: {'seconds':, 'vertices_s':, 'mb_s':, 'peak_mb':}} """
+  def __init__(self, repeat=3, memory=True):
+    self.repeat = repeat
+    self.memory = memory
+    self.results = {}
+    self._udp = None
+
+  def run(self, name, func, setup=None, vertices=0, nbytes=0):
+    t, peak = measure(func, setup, repeat=self.repeat, memory=self.memory)
+    t = max(t, 1e-9)
+    r = { 'seconds': t, 'vertices_s': vertices / t, 'mb_s': nbytes / t / 1e6,
+          'peak_mb': None if peak is None else peak / 1e6 }
+    self.results[name] = r
+    print("%-40s %9.4f s %12.0f vert/s %8.2f MB/s %9s MB" %
+          (name, t, r['vertices_s'], r['mb_s'], "-" if peak is None else "%.2f" % r['peak_mb']))
+    sys.stdout.flush()
+    return r
+
+  def encoder(self, name, job, vertices):
+    def write(rd):
+      fd = io.BytesIO()
+      rd.write(fd)
+      return fd
+    data = write(synthetic_ruida(job)).getvalue()
+    self.run(name + " write", write, lambda: synthetic_ruida(job), vertices, len(data))
+    return data
+
+  def scrambler(self, name, data, vertices):
+    self.run(name + " scramble", lambda arg: ruidacodec.scramble_bytes(data), None, vertices, len(data))
+
+  def parser(self, name, data, vertices=None):
+    """ data is the scrambled file content """
+    plain = ruidacodec.unscramble_bytes(data)
+    p = RuidaParser(buf=plain)
+    p.decode()
+    if vertices is None: vertices = count_vertices(p)
+    self.run(name + " decode", lambda arg: RuidaParser(buf=plain).decode(), None, vertices, len(data))
+    self.run(name + " decode_geometry", lambda arg: RuidaParser(buf=plain).decode(geometry=True), None, vertices, len(data))
+    self.run(name + " decode_columns", lambda arg: RuidaParser(buf=plain).decode(columns=True), None, vertices, len(data))
+    self.run(name + " to_svg", lambda arg: p.to_svg(), None, vertices, len(data))
+
+  def udp(self, name, data, vertices):
+    if self._udp is None:
+      self._udp = AckServer()
+      self._udp.start()
+    def send(laser):
+      laser.write(data)
+      laser.sock.close()
+    def connect():
+      laser = RuidaUdp('127.0.0.1', self._udp.port, localport=0)
+      laser.verbose = False
+      return laser
+    self.run(name + " udp", send, connect, vertices, len(data))
+
+
+def compare(results, baseline, threshold, slack=0.002):
+  """
+  returns the list of regressions, as printable strings. Differences of less
+  than slack seconds are timer noise, not regressions. A benchmark that is
+  not in the baseline is reported too, it could not be checked.
+  """
+  bad = []
+  for name in sorted(results):
+    if name not in baseline:
+      bad.append("MISSING    %-40s not in the baseline, save a new one with --save" % name)
+      continue
+    new, old = results[name], baseline[name]
+    if new['seconds'] > old['seconds'] * (1 + threshold) + slack:
+      bad.append("REGRESSION %-40s %9.4f s, baseline %9.4f s (%+.0f%%)" %
+                 (name, new['seconds'], old['seconds'], 100.0 * (new['seconds'] / old['seconds'] - 1)))
+    if new.get('peak_mb') and old.get('peak_mb') and new['peak_mb'] > old['peak_mb'] * (1 + threshold):
+      bad.append("REGRESSION %-40s %9.2f MB, baseline %9.2f MB (%+.0f%%)" %
+                 (name, new['peak_mb'], old['peak_mb'], 100.0 * (new['peak_mb'] / old['peak_mb'] - 1)))
+  return bad
+
+
+if __name__ == '__main__':
+  ap = argparse.ArgumentParser(description="benchmark the ruida encoder, parser and udp chunker.")
+  ap.add_argument('files', nargs='*', help=".rd files to parse, default: example-files/*.rd")
+  ap.add_argument('--sizes', default='1k,10k,100k', help="synthetic job sizes in vertices, e.g. 1k,10k,100k,1M,10M")
+  ap.add_argument('--layers', type=int, default=4, help="layers per synthetic job")
+  ap.add_argument('--rel', type=float, default=0.9, help="fraction of relative steps in synthetic jobs")
+  ap.add_argument('--kind', default='array', choices=['list', 'array', 'store'], help="path representation of synthetic jobs")
+  ap.add_argument('--seed', type=int, default=1)
+  ap.add_argument('--parse-max', type=parse_size, default=100000, help="largest synthetic job to parse and send, in vertices")
+  ap.add_argument('--repeat', type=int, default=3)
+  ap.add_argument('--no-memory', action='store_true', help="skip the tracemalloc runs")
+  ap.add_argument('--no-udp', action='store_true', help="skip the udp benchmarks")
+  ap.add_argument('--baseline', default=BASELINE, help="baseline file, default: %(default)s")
+  ap.add_argument('--save', action='store_true', help="store the results as the new baseline")
+  ap.add_argument('--threshold', type=float, default=0.25, help="allowed slowdown, 0.25 = 25%%")
+  args = ap.parse_args()
+
+  bench = Bench(repeat=args.repeat, memory=not args.no_memory)
+  files = args.files or sorted(glob.glob(os.path.join(EXAMPLES, '*.rd')))
+  print("%-40s %11s %19s %13s %12s" % ("benchmark", "time", "vertices", "bytes", "peak"))
+  for file in files:
+    with open(file, 'rb') as fd: data = fd.read()
+    name = os.path.basename(file)
+    p = RuidaParser(buf=ruidacodec.unscramble_bytes(data))
+    p.decode()
+    vertices = count_vertices(p)
+    bench.parser(name, data, vertices)
+    bench.scrambler(name, data, vertices)
+    if not args.no_udp: bench.udp(name, data, vertices)
+
+  for size in [parse_size(s) for s in args.sizes.split(',')]:
+    name = "synth-%s-%dl-%s" % (size, args.layers, args.kind)
+    job = synthetic_job(size, layers=args.layers, rel=args.rel, seed=args.seed, kind=args.kind)
+    data = bench.encoder(name, job, size)
+    bench.scrambler(name, data, size)
+    if size <= args.parse_max:
+      bench.parser(name, data, size)
+      if not args.no_udp: bench.udp(name, data, size)
+
+  if args.save:
+    info = { 'version': __version__, 'python': platform.python_version(), 'machine': platform.machine(),
+             'threshold': args.threshold, 'results': bench.results }
+    with open(args.baseline, 'w') as fd:
+      json.dump(info, fd, indent=1, sort_keys=True)
+    print("baseline saved to " + args.baseline)
+  elif os.path.exists(args.baseline):
+    with open(args.baseline) as fd: baseline = json.load(fd)
+    bad = compare(bench.results, baseline['results'], args.threshold)
+    for b in bad: print(b)
+    if bad: sys.exit(1)
+    print("no regressions against " + args.baseline)
+  else:
+    print("no baseline %s to compare with, save one with --save" % args.baseline)
@@ -3,6 +3,8 @@
 # (c) 2017 Patrick Himmelmann et.al.
 # 2017-05-21
 
+from ruidacodec import scramble, unscramble, scramble_bytes, unscramble_bytes
+
 
 def end_command(payload):
     data=scramble_bytes(payload)
@@ -57,31 +59,4 @@ def unscramble_packet(p,checksum=False):
         return unscramble_string(string)
 
 def unscramble_string(s):
-    return [unscramble(b) for b in bytes.fromhex(s)]
-
-def unscramble(b):
-    res_b=b-1
-    if res_b<0: res_b+=0x100
-    res_b^=0x88
-    fb=res_b&0x80
-    lb=res_b&1
-    res_b=res_b-fb-lb
-    res_b|=lb<<7
-    res_b|=fb>>7
-    return res_b
-
-def scramble(b):
-    fb=b&0x80
-    lb=b&1
-    res_b=b-fb-lb
-    res_b|=lb<<7
-    res_b|=fb>>7
-    res_b^=0x88
-    res_b+=1
-    if res_b>0xff:res_b-=0x100
-    return res_b
-
-def scramble_bytes(bs):
-    return bytes([scramble(b) for b in bs])
-def unscramble_bytes(bs):
-    return bytes([unscramble(b) for b in bs])
+    return list(unscramble_bytes(bytes.fromhex(s)))
@@ -0,0 +1,56 @@
+#! /usr/bin/python3
+#
+# rdsnapstat.py -- compare geometry sizes with and without micrometer grid snapping.
+#
+# Decodes each given .rd file, and encodes its paths again with Ruida,
+# once in the default scheme (absolute moves forced every _forceabs relative moves),
+# and once with snap=True (integer micrometer deltas, no forced absolute moves).
+#
+# Usage: python3 rdsnapstat.py ../example-files/*.rd
+#
+# 2026-10-18, v1.0, agent:    Initial version.
+# 2026-10-18, v1.1, agent:    decode(geometry=True), only the paths are needed.
+# 2026-10-18, v1.2, agent:    the file is mapped, see RuidaParser(lazy=True).
+#
+import sys
+from ruidaparser import RuidaParser
+from ruida import Ruida
+
+
+def decoded_paths(file):
+  """ returns the paths of an .rd file, grouped by layer number. """
+  with RuidaParser(file=file, lazy=True) as r:
+    r.decode(geometry=True)
+  layers = {}
+  for p in r._paths:
+    lay = p['layer']
+    if type(lay) == type({}): lay = lay['n']
+    layers.setdefault(lay, []).append(p['data'])
+  return [layers[n] for n in sorted(layers, key=str)]
+
+
+def geometry_size(rd, layers):
+  size = 0
+  for paths in layers:
+    if rd._snap: size += sum([len(b) for b in rd.encode_paths_snapped(paths)])
+    else:        size += sum([len(b) for b in rd.encode_paths(paths)])
+  return size
+
+
+if __name__ == '__main__':
+  if len(sys.argv) < 2:
+    print("Usage: %s FILE.rd ..." % sys.argv[0])
+    sys.exit(1)
+
+  total = [0, 0]
+  print("%-52s %10s %10s %10s" % ("file", "default", "snap", "saved"))
+  for file in sys.argv[1:]:
+    layers = decoded_paths(file)
+    default = geometry_size(Ruida(), layers)
+    rd = Ruida()
+    rd.set(snap=True)
+    snapped = geometry_size(rd, layers)
+    total[0] += default
+    total[1] += snapped
+    print("%-52s %10d %10d %10d" % (file, default, snapped, default-snapped))
+  print("%-52s %10d %10d %10d" % ("total", total[0], total[1], total[0]-total[1]))
@@ -38,8 +38,39 @@
 # 2017-12-18, jw@fabmail.org
 #     v1.6 -- encode_byte() encode_color() added.
 #             multi layer support in header() and body() done.
-
-import sys, re, math, copy
+# 2026-10-18, agent@local
+#     v1.7 -- header(), body() and enc() append into a bytearray.
+#             Encoding is now linear in the number of vertices.
+#     v1.8 -- enc() compiles each format once into a template of constant
+#             bytes and variable fields. No regex work per vertex.
+#     v1.9 -- scramble via the shared translation tables in ruidacodec.py
+#     v1.10 - write_iter() and body_iter() generators. write() streams in chunks.
+#     v1.11 - RuidaPathArray: paths as numpy arrays, encoded vectorized.
+#     v1.12 - optimize() reorders paths to reduce travel, see ruidaoptimize.py
+#     v1.13 - optimize(rotate=True, reverse=True) picks start points and directions.
+#     v1.14 - simplify() drops vertices within a tolerance, default _beam/4.
+#     v1.15 - set(snap=True): drift free relative moves on the micrometer grid.
+#     v1.16 - RuidaLayer.stats(): bbox, odometer and counts in one cached pass.
+#     v1.17 - Cache the encoded prolog and geometry per layer, dirty flags set by set().
+#     v1.18 - set(workers=N): encode layers and large path ranges on a process pool.
+#     v1.19 - RuidaPathStore: integer micrometer paths in array('i'), 8 bytes per vertex.
+#     v1.20 - RuidaRasterLayer: bitmap engraving with run length scanlines, see ruidaraster.py
+#     v1.21 - estimate(): exact file size and trapezoidal runtime, without encoding.
+#     v1.22 - RuidaProfile: time, bytes, vertices and opcodes per phase and layer of write().
+
+import sys, re, math, copy, itertools, time, json
+from array import array
+import ruidacodec, ruidaoptimize, ruidaraster
+
+try:
+  import numpy          # optional. Only needed for RuidaPathArray.
+except ImportError:
+  numpy = None
+
+try:
+  from concurrent import futures        # optional. Only needed for set(workers=N). python2: pip install futures
+except ImportError:
+  futures = None
 
 # python2 has a completely useless alias bytes = str. Fix this:
 if sys.version_info.major < 3:
@@ -47,11 +78,371 @@ if sys.version_info.major < 3:
                 "Minimalistic python3 compatible implementation used in python2."
                 return "".join(map(chr, tupl))
 
+class RuidaLayerStats():
+  """
+  Geometry statistics of the paths of one layer, collected in a single pass.
+  See RuidaLayer.stats().
+
+  bbox      [[xmin, ymin], [xmax, ymax]] as from Ruida.boundingbox(), or None without vertices.
+  cut       cut distance in mm, as from Ruida.odometer()[0]
+  travel    travel distance in mm, as from Ruida.odometer()[1], starting at [0,0]
+  vertices  number of points in all paths
+  segments  number of cut segments, i.e. vertices minus non-empty paths.
+  """
+  def __init__(self, paths=None):
+    self.bbox = None
+    self.cut = 0
+    self.travel = 0
+    self.vertices = 0
+    self.segments = 0
+    if paths is None: return
+    # the vectorized sums are identical, see RuidaPathArray.odometer()
+    if numpy is not None and not isinstance(paths, (RuidaPathArray, RuidaPathStore)): paths = RuidaPathArray.from_paths(paths)
+    if numpy is not None:
+      o = paths.offset_array() if isinstance(paths, RuidaPathStore) else paths.offsets
+      self.vertices = int(o[-1])
+      if self.vertices: self.bbox = paths.boundingbox()
+      self.cut, self.travel = paths.odometer()
+      self.segments = self.vertices - int((o[1:] > o[:-1]).sum())
+      return
+
+    # Same arithmetic as in Ruida.odometer(), so that the sums are identical.
+    xy = [0, 0]
+    for path in paths:
+      if not len(path): continue
+      traveling = True
+      for point in path:
+        dx = point[0] - xy[0]
+        dy = point[1] - xy[1]
+        if traveling:
+          self.travel += math.sqrt(dx*dx+dy*dy)
+          traveling = False
+          if self.bbox is None:
+            xmin = xmax = point[0]
+            ymin = ymax = point[1]
+            self.bbox = True
+        else:
+          self.cut += math.sqrt(dx*dx+dy*dy)
+        if point[0] > xmax: xmax = point[0]
+        if point[0] < xmin: xmin = point[0]
+        if point[1] > ymax: ymax = point[1]
+        if point[1] < ymin: ymin = point[1]
+        xy = point
+      self.vertices += len(path)
+      self.segments += len(path) - 1
+    if self.bbox: self.bbox = [[xmin, ymin], [xmax, ymax]]
+
+  def odometer(self):
+    return [ self.cut, self.travel ]
+
+
+class RuidaPathArray():
+  """
+  Paths in array form, as an alternative to nested lists:
+
+  xy = numpy array of shape (N, 2), all vertices of all paths in mm.
+  offsets = [0, 5, 9]
+       Index into xy of the first vertex of each path.
+
+  Iterating yields one (n, 2) view into xy per path, so that a RuidaPathArray
+  can be used wherever a list of paths is accepted. body() encodes it with
+  numpy, see Ruida.encode_path_array().
+  """
+  def __init__(self, xy, offsets=None):
+    if numpy is None: raise ImportError("RuidaPathArray needs numpy")
+    self.xy = numpy.asarray(xy, dtype=numpy.float64).reshape(-1, 2)
+    if offsets is None: offsets = [0]
+    # internally, the end of the last path is appended.
+    self.offsets = numpy.append(numpy.asarray(offsets, dtype=numpy.int64), len(self.xy))
+
+  @classmethod
+  def from_paths(cls, paths):
+    """ Convert a nested list of paths [[[x,y], ...], ...] """
+    offsets = [0]
+    for path in paths: offsets.append(offsets[-1] + len(path))
+    chain = itertools.chain.from_iterable
+    xy = numpy.fromiter(chain(chain(paths)), dtype=numpy.float64, count=2*offsets[-1])
+    return cls(xy.reshape(-1, 2), offsets[:-1])
+
+  def __len__(self):
+    return len(self.offsets) - 1
+
+  def __getitem__(self, i):
+    if i < 0: i += len(self)
+    if i < 0 or i >= len(self): raise IndexError("path index out of range")
+    return self.xy[self.offsets[i]:self.offsets[i+1]]
+
+  def __iter__(self):
+    for i in range(len(self)):
+      yield self.xy[self.offsets[i]:self.offsets[i+1]]
+
+  def subset(self, start, stop):
+    """ paths start to stop-1 as a new RuidaPathArray, sharing the vertex data. """
+    o = self.offsets
+    return RuidaPathArray(self.xy[o[start]:o[stop]], o[start:stop] - o[start])
+
+  def reorder(self, plan):
+    """
+    Returns a new RuidaPathArray with the paths arranged as in plan,
+    see ruidaoptimize.order_paths(). plan is a list of (index, start_vertex, reversed).
+    """
+    plan = numpy.asarray(plan, dtype=numpy.int64).reshape(-1, 3)
+    starts = self.offsets[plan[:,0]]
+    lens = self.offsets[plan[:,0]+1] - starts
+    offsets = numpy.concatenate([[0], numpy.cumsum(lens)[:-1]]).astype(numpy.int64)
+    # position k of each vertex within its path, and the per path parameters
+    k = numpy.arange(int(lens.sum())) - numpy.repeat(offsets, lens)
+    n = numpy.repeat(lens, lens)
+    v = numpy.repeat(plan[:,1], lens)
+    rot = v > 0
+    # closed paths rotated by v: the last vertex repeats the new first one.
+    k[rot] = (k[rot] + v[rot]) % (n[rot] - 1)
+    rev = numpy.repeat(plan[:,2] > 0, lens)
+    k[rev] = n[rev] - 1 - k[rev]
+    return RuidaPathArray(self.xy[numpy.repeat(starts, lens) + k], offsets)
+
+  def boundingbox(self):
+    """ see Ruida.boundingbox() """
+    if not len(self.xy): raise ValueError("no paths")
+    x = self.xy[:,0]            # per column, much faster than min(axis=0)
+    y = self.xy[:,1]
+    return [[float(x.min()), float(y.min())], [float(x.max()), float(y.max())]]
+
+  def odometer(self, init=[0,0], return_home=False):
+    """
+    see Ruida.odometer(). The sums are accumulated in the same order as there,
+    so the results are identical.
+    """
+    n = len(self.xy)
+    if n == 0:
+      return [ 0, 0 ]
+    travel = numpy.zeros(n, dtype=bool)
+    travel[self.offsets[:-1][self.offsets[:-1] < n]] = True
+    cut_d, trav_d = _odometer_sums(self.xy[:,0], self.xy[:,1], travel, init)
+    if return_home:
+      dx = init[0] - self.xy[-1][0]
+      dy = init[1] - self.xy[-1][1]
+      trav_d += math.sqrt(dx*dx+dy*dy)
+    return [ cut_d, trav_d ]
+
+
+def _odometer_sums(x, y, travel, init, unit=1.0, blocksize=0x4000):
+  """
+  Cut and travel distance of the vertices x, y, starting at init, for
+  RuidaPathArray.odometer() and RuidaPathStore.odometer(). The distances
+  are divided by unit and summed in order, as in Ruida.odometer(). In
+  blocks, so that the temporaries stay small.
+  """
+  cut_d = trav_d = 0.0
+  for b in range(0, len(x), blocksize):
+    bx = x[b:b+blocksize]
+    by = y[b:b+blocksize]
+    dx = numpy.empty(len(bx))
+    dy = numpy.empty(len(by))
+    dx[0] = bx[0] - (init[0] if b == 0 else x[b-1])
+    dy[0] = by[0] - (init[1] if b == 0 else y[b-1])
+    numpy.subtract(bx[1:], bx[:-1], out=dx[1:])
+    numpy.subtract(by[1:], by[:-1], out=dy[1:])
+    d = numpy.sqrt(dx*dx+dy*dy)
+    if unit != 1.0: d /= unit
+    t = travel[b:b+blocksize]
+    # cumsum() continues the running sums, pairwise sum() would round differently.
+    cut_d  = numpy.cumsum(numpy.concatenate([[cut_d], d * ~t]))[-1]
+    trav_d = numpy.cumsum(numpy.concatenate([[trav_d], d * t]))[-1]
+  return float(cut_d), float(trav_d)
+
+
+class RuidaPathView():
+  """
+  One path of a RuidaPathStore. No vertex data is copied.
+  Indexing yields [x, y] in mm, slicing a list of those, as with a list path.
+  """
+  __slots__ = ('_xy', '_start', '_stop')
+
+  def __init__(self, xy, start, stop):
+    self._xy = xy               # the interleaved micrometer array of the store
+    self._start = start         # vertex indices
+    self._stop = stop
+
+  def __len__(self):
+    return self._stop - self._start
+
+  def __getitem__(self, i):
+    if isinstance(i, slice): return [self[k] for k in range(*i.indices(len(self)))]
+    if i < 0: i += len(self)
+    if i < 0 or i >= len(self): raise IndexError("vertex index out of range")
+    j = 2*(self._start + i)
+    return [self._xy[j] / 1000.0, self._xy[j+1] / 1000.0]
+
+  def __iter__(self):
+    xy = self._xy
+    for j in range(2*self._start, 2*self._stop, 2):
+      yield [xy[j] / 1000.0, xy[j+1] / 1000.0]
+
+  def microns(self):
+    """ memoryview of the interleaved integer micrometer coordinates x0, y0, x1, y1, ... """
+    return memoryview(self._xy)[2*self._start:2*self._stop]
+
+
+class RuidaPathStore():
+  """
+  Compact storage for paths of large jobs: all vertices on the micrometer
+  grid as integers in one array('i'), x and y interleaved, plus a table of
+  path offsets. This needs 8 bytes per vertex, nested lists need more than
+  100.
+
+  Indexing and iterating yield RuidaPathView objects, so that a
+  RuidaPathStore can be used wherever a list of paths is accepted.
+  Coordinates are rounded to the micrometer on input, thus body() encodes
+  them exactly, like with _snap. numpy is used for bounding box, odometer
+  and encoding when available, but not required.
+  """
+  __slots__ = ('xy', 'offsets')
+
+  def __init__(self, paths=None):
+    self.xy = array('i')
+    self.offsets = array('l', [0])      # the end of the last path is always appended.
+    if paths is not None: self.extend(paths)
+
+  @classmethod
+  def from_microns(cls, xy, offsets=None):
+    """
+    Construct from integer micrometer coordinates: xy is a flat sequence
+    x0, y0, x1, y1, ... or a numpy array of shape (N, 2). offsets is the
+    index of the first vertex of each path.
+    """
+    store = cls()
+    if hasattr(xy, 'shape'):
+      # no python objects per vertex, the buffer is copied as is.
+      store.xy.frombytes(numpy.ascontiguousarray(xy, dtype='i%d' % store.xy.itemsize).tobytes())
+    else:
+      store.xy.extend(xy)
+    if offsets is None: offsets = [0]
+    if hasattr(offsets, 'shape'):
+      store.offsets = array('l')
+      store.offsets.frombytes(numpy.ascontiguousarray(offsets, dtype='i%d' % store.offsets.itemsize).tobytes())
+      store.offsets.append(len(store.xy) // 2)
+    else:
+      store.offsets = array('l', [int(o) for o in offsets] + [len(store.xy) // 2])
+    return store
+
+  def append(self, path):
+    """ add a path [[x, y], ...] given in mm. """
+    self.xy.extend([int(round(c * 1000)) for p in path for c in (p[0], p[1])])
+    self.offsets.append(len(self.xy) // 2)
+
+  def extend(self, paths):
+    """ add paths, e.g. a nested list or a RuidaPathArray. """
+    if isinstance(paths, RuidaPathArray):
+      # no python objects per vertex, the buffers are copied as is.
+      start = len(self.xy) // 2
+      self.xy.frombytes(numpy.round(paths.xy * 1000).astype('i%d' % self.xy.itemsize).tobytes())
+      self.offsets.frombytes((paths.offsets[1:] + start).astype('i%d' % self.offsets.itemsize).tobytes())
+      return
+    for path in paths: self.append(path)
+
+  def __len__(self):
+    return len(self.offsets) - 1
+
+  def __getitem__(self, i):
+    if i < 0: i += len(self)
+    if i < 0 or i >= len(self): raise IndexError("path index out of range")
+    return RuidaPathView(self.xy, self.offsets[i], self.offsets[i+1])
+
+  def __iter__(self):
+    o = self.offsets
+    for i in range(len(o) - 1):
+      yield RuidaPathView(self.xy, o[i], o[i+1])
+
+  def vertices(self):
+    return len(self.xy) // 2
+
+  def microns(self):
+    """ numpy array of shape (N, 2), sharing the integer micrometer data of the store. """
+    if numpy is None: raise ImportError("RuidaPathStore.microns() needs numpy")
+    return numpy.frombuffer(self.xy, dtype='i%d' % self.xy.itemsize).reshape(-1, 2)
+
+  def offset_array(self):
+    """ numpy array sharing the offsets, with the end appended as in RuidaPathArray. """
+    if numpy is None: raise ImportError("RuidaPathStore.offset_array() needs numpy")
+    return numpy.frombuffer(self.offsets, dtype='i%d' % self.offsets.itemsize)
+
+  def as_array(self):
+    """ A RuidaPathArray in mm. Needs numpy, the coordinates are copied. """
+    return RuidaPathArray(self.microns() / 1000.0, numpy.asarray(self.offsets[:-1], dtype=numpy.int64))
+
+  def subset(self, start, stop):
+    """ paths start to stop-1 as a new RuidaPathStore. """
+    o = self.offsets
+    store = RuidaPathStore()
+    store.xy = self.xy[2*o[start]:2*o[stop]]
+    store.offsets = array('l', [v - o[start] for v in o[start:stop+1]])
+    return store
+
+  def reorder(self, plan):
+    """
+    Returns a new RuidaPathStore with the paths arranged as in plan,
+    see ruidaoptimize.order_paths() and RuidaPathArray.reorder().
+    """
+    store = RuidaPathStore()
+    for i, v, rev in plan:
+      seg = self.xy[2*self.offsets[i]:2*self.offsets[i+1]]
+      if v: seg = seg[2*v:-2] + seg[:2*v+2]
+      if rev:
+        r = array('i', seg)
+        r[0::2] = seg[-2::-2]
+        r[1::2] = seg[-1::-2]
+        seg = r
+      store.xy.extend(seg)
+      store.offsets.append(len(store.xy) // 2)
+    return store
+
+  def boundingbox(self):
+    """ see Ruida.boundingbox() """
+    if not len(self.xy): raise ValueError("no paths")
+    if numpy is not None:
+      m = self.microns()
+      x = m[:,0]
+      y = m[:,1]
+      return [[x.min() / 1000.0, y.min() / 1000.0], [x.max() / 1000.0, y.max() / 1000.0]]
+    x = self.xy[0::2]
+    y = self.xy[1::2]
+    return [[min(x) / 1000.0, min(y) / 1000.0], [max(x) / 1000.0, max(y) / 1000.0]]
+
+  def odometer(self, init=[0,0], return_home=False):
+    """
+    see RuidaPathArray.odometer(). Needs numpy. The differences are taken
+    from the micrometers without a float copy of the coordinates.
+    """
+    m = self.microns()
+    n = len(m)
+    if n == 0:
+      return [ 0, 0 ]
+    o = self.offset_array()[:-1]
+    travel = numpy.zeros(n, dtype=bool)
+    travel[o[o < n]] = True
+    cut_d, trav_d = _odometer_sums(m[:,0], m[:,1], travel, [init[0] * 1000.0, init[1] * 1000.0], 1000.0)
+    if return_home:
+      dx = init[0] - m[-1,0] / 1000.0
+      dy = init[1] - m[-1,1] / 1000.0
+      trav_d += math.sqrt(dx*dx+dy*dy)
+    return [ cut_d, trav_d ]
+
+
 class RuidaLayer():
   """
+  paths is a nested list [[[x,y], ...], ...], a RuidaPathArray or a RuidaPathStore.
+  A numpy array of shape (N, 2) is also accepted, together with offsets,
+  the index of the first vertex of each path.
   """
-  def __init__(self, paths=None, speed=None, power=None, bbox=None, color=[0,0,0], freq=20.0):
+  def __init__(self, paths=None, speed=None, power=None, bbox=None, color=[0,0,0], freq=20.0, offsets=None):
+    if hasattr(paths, 'shape'): paths = RuidaPathArray(paths, offsets)
     self._paths = paths
+    self._stats = None          # cache for stats()
+    self._geometry = None       # cached encoded paths, a list of blocks. See Ruida.body_iter()
+    self._prolog = None         # cached (lnum, encoded speed and power), see Ruida.layer_prolog()
+    self._prepared = False      # simplify() and optimize() of Ruida.write() are done, see write_iter()
+    self._dirty = True          # the header of the Ruida object needs an update.
 
     self._bbox  = bbox
     self._speed = speed
@@ -59,14 +450,183 @@ class RuidaLayer():
     self._color = color
     self._freq  = freq
 
-  def set(self, paths=None, speed=None, power=None, bbox=None, color=None, freq=None):
-    if paths is not None: self._paths = paths
+  def set(self, paths=None, speed=None, power=None, bbox=None, color=None, freq=None, offsets=None):
+    """
+    Each change marks the layer dirty, so that Ruida.write() rebuilds the
+    header. New paths drop the cached stats and geometry, new speed or
+    power only drop the cached prolog.
+    """
+    if hasattr(paths, 'shape'): paths = RuidaPathArray(paths, offsets)
+    if paths is not None:
+      self._paths = paths
+      self._stats = None
+      self._geometry = None
+      self._prepared = False
     if speed is not None: self._speed = speed
     if power is not None: self._power = power
     if bbox  is not None: self._bbox  = bbox
     if color is not None: self._color = color
     if freq  is not None: self._freq  = freq
+    if speed is not None or power is not None: self._prolog = None
+    if paths is not None or speed is not None or power is not None or \
+       bbox is not None or color is not None or freq is not None: self._dirty = True
+
+  def uncache(self):
+    """ Drop the cached geometry and prolog, e.g. after changing Ruida._forceabs """
+    self._geometry = None
+    self._prolog = None
+
+  def stats(self):
+    """
+    Returns the RuidaLayerStats of the paths, computed once and cached until
+    set(paths=...) is called. Modify paths only through set(), or the cache
+    gets stale.
+    """
+    if self._stats is None: self._stats = RuidaLayerStats(self._paths)
+    return self._stats
 
+  def bbox(self):
+    """ The bbox given to set(), or else the bounding box of the paths. """
+    if self._bbox is not None: return self._bbox
+    return self.stats().bbox
+
+
+class RuidaRasterLayer(RuidaLayer):
+  """
+  A layer that engraves a bitmap image line by line, see ruidaraster.py.
+
+  image is a 2D array, one value per pixel, the first row at the top:
+  boolean (True is ink), or greyscale 0 (black) .. 255 (white), where values
+  below threshold are ink. dither=True engraves grey as a dot pattern.
+  dpi is the resolution of the image, origin the position of its top left
+  corner in mm. overscan in mm is added on both ends of each scanline.
+  bidirectional=False engraves all lines left to right.
+
+  The scanlines are kept as a RuidaPathStore, so that encoding, stats and
+  caching work as for other layers. optimize() and simplify() leave them
+  alone. The bbox is that of the ink, without overscan. Needs numpy.
+  """
+  def __init__(self, image=None, dpi=254, origin=[0,0], threshold=128, dither=False, overscan=2.0, bidirectional=True,
+               speed=None, power=None, color=[0,0,0], freq=20.0):
+    RuidaLayer.__init__(self, speed=speed, power=power, color=color, freq=freq)
+    self._dpi = dpi
+    self._origin = origin
+    self._threshold = threshold
+    self._dither = dither
+    self._overscan = overscan
+    self._bidirectional = bidirectional
+    if image is not None: self.set_image(image)
+
+  def set_image(self, image, dpi=None, origin=None, threshold=None, dither=None, overscan=None, bidirectional=None):
+    """
+    Convert image into scanlines. Parameters not given keep their values.
+    Raises ValueError for an image without ink, a layer needs a bounding box.
+    The layer is then left unchanged.
+    """
+    if dpi           is None: dpi           = self._dpi
+    if origin        is None: origin        = self._origin
+    if threshold     is None: threshold     = self._threshold
+    if dither        is None: dither        = self._dither
+    if overscan      is None: overscan      = self._overscan
+    if bidirectional is None: bidirectional = self._bidirectional
+    ink = ruidaraster.ink_mask(image, threshold, dither)
+    xy, offsets, bbox = ruidaraster.scanlines(ink, dpi, origin, overscan, bidirectional)
+    if bbox is None: raise ValueError("set_image(): the image has no ink, threshold=%s" % threshold)
+    self._dpi = dpi
+    self._origin = origin
+    self._threshold = threshold
+    self._dither = dither
+    self._overscan = overscan
+    self._bidirectional = bidirectional
+    self._bbox = None
+    self.set(paths=RuidaPathStore.from_microns(xy, offsets), bbox=bbox)
+
+
+
+def _encode_part(args):
+  """
+  Worker function for Ruida.encode_parallel(). Encodes one part of the paths
+  of a layer in another process. Must be at module level, to be pickled.
+  """
+  forceabs, snap, paths = args
+  rd = Ruida()
+  rd._forceabs = forceabs
+  rd._snap = snap
+  return b''.join(rd.encode_geometry(paths))
+
+
+class RuidaProfile():
+  """
+  Instrumentation for Ruida.write(). Pass it to write() or write_iter(),
+  or attach it with Ruida.set(profile=...). It then collects per phase:
+
+  phases = { 'header': { 'seconds': 0.001, 'bytes': 137, 'calls': 1 }, ... }
+       prepare: simplify(), optimize() and encode_parallel()
+       stats:   bounding boxes and odometers, see RuidaLayer.stats()
+       header, body, odometer, trailer: encoding
+       scramble: scramble_bytes() of all chunks
+       io:      time spent by the consumer, e.g. fd.write() or the network
+
+  and per layer:
+
+  layers = [ { 'n': 0, 'seconds': 0.02, 'bytes': 5012, 'vertices': 812, 'cached': False,
+               'ops': { 'abs': 9, 'rel': 700, 'horiz': 50, 'vert': 44 } }, ... ]
+
+  The opcodes are counted in the encoded body, moves and cuts together.
+  Repeated writes accumulate, until reset(). Without a profile, write()
+  does not look at the clock.
+  """
+  OPS = { 'abs': b'\x88\xa8', 'rel': b'\x89\xa9', 'horiz': b'\x8a\xaa', 'vert': b'\x8b\xab' }
+
+  def __init__(self, clock=None):
+    self.clock = clock or getattr(time, 'perf_counter', time.time)
+    self.reset()
+
+  def reset(self):
+    self.phases = {}
+    self.layers = []
+    self.writes = 0
+
+  def add(self, phase, since, data=None, lnum=None):
+    """
+    Accounts the time from since until now, and the length of data to phase,
+    and with lnum to that layer. Returns the clock after the bookkeeping,
+    to be passed as since to the next call.
+    """
+    seconds = self.clock() - since
+    p = self.phases.setdefault(phase, { 'seconds': 0.0, 'bytes': 0, 'calls': 0 })
+    p['seconds'] += seconds
+    p['calls'] += 1
+    if data is not None: p['bytes'] += len(data)
+    if lnum is not None:
+      l = self.layers[lnum]
+      l['seconds'] += seconds
+      if data is not None:
+        l['bytes'] += len(data)
+        for op in self.OPS:
+          l['ops'][op] += data.count(self.OPS[op][0:1]) + data.count(self.OPS[op][1:2])
+    return self.clock()
+
+  def layer(self, lnum, layer, cached):
+    """
+    starts the accounting for layer number lnum. cached tells, if the layer
+    had its encoded geometry from an earlier write(), before this one started.
+    """
+    while len(self.layers) <= lnum:
+      self.layers.append({ 'n': len(self.layers), 'seconds': 0.0, 'bytes': 0, 'vertices': 0,
+                           'cached': True, 'ops': dict([(op, 0) for op in self.OPS]) })
+    l = self.layers[lnum]
+    l['vertices'] += layer.stats().vertices
+    l['cached'] = l['cached'] and cached
+
+  def as_dict(self):
+    total = { 'seconds': sum([p['seconds'] for p in self.phases.values()]),
+              'bytes': sum([self.phases[p]['bytes'] for p in self.phases if p in ('header', 'body', 'trailer')]),
+              'vertices': sum([l['vertices'] for l in self.layers]) }
+    return copy.deepcopy({ 'writes': self.writes, 'total': total, 'phases': self.phases, 'layers': self.layers })
+
+  def to_json(self, **kwargs):
+    return json.dumps(self.as_dict(), **kwargs)
 
 
 class Ruida():
@@ -78,6 +638,12 @@ class Ruida():
             [[12,10], [38,25], [12,40], [12,10]]
            ]
         This example is a 50 mm square, with a 30 mm triangle inside.
+        Large jobs can pass a numpy array of all vertices instead, with
+        offsets = [0, 5]. See RuidaPathArray.
+        Multi-million vertex jobs are best stored in a RuidaPathStore,
+        integer micrometers at 8 bytes per vertex.
+        For engraving a bitmap, use set(image=..., dpi=...) or a RuidaRasterLayer.
+        Call optimize() or set(optimize=True) to reorder paths.
 
    speed = 30
    speed = [ 1000, 30 ]
@@ -108,13 +674,16 @@ class Ruida():
         Expected as a triple [RED, GREEN, BLUE] each in [0..255]
   """
 
-  __version__ = "1.6"
+  __version__ = "1.22"
+
+  _enc_templates = {}       # shared by all instances, filled by enc_template()
 
   def __init__(self, layers=None):
     if layers is None: layers = []
     self._layers = layers
 
     self._odo = None
+    self._odo_auto = False      # _odo was summed by write(), not given to set().
     self._globalbbox = None
 
     self._header = None
@@ -132,21 +701,88 @@ class Ruida():
     # Set to 0, to never force an absolute move. Allows potentially infinite precision loss.
     self._forceabs = 100
 
+    # Round all vertices to the micrometer grid before encoding. Relative moves are then
+    # exact, and _forceabs is not needed. See encode_paths_snapped().
+    self._snap = False
+
+    # Diameter of the laser beam in mm. The default tolerance of simplify() is a quarter of it.
+    self._beam = 0.1
+
+    # Simplify paths in write(): True or a tolerance in mm. See simplify().
+    self._simplify = None
+
+    # Reorder paths in write() to reduce travel moves. See optimize().
+    # True, or a dict of keyword arguments for optimize(), e.g. { 'rotate':True, 'reverse':True }
+    self._optimize = False
+
+    # Keep the encoded geometry of each layer for the next write(). Repeated exports
+    # with other speed or power settings then only encode the layer prologs again.
+    # This holds the whole encoded body in memory, about 3 to 11 bytes per vertex.
+    # Set to False for huge jobs, to keep memory use flat: the geometry is then
+    # encoded again on each write(), only the simplified and optimized paths are kept.
+    self._cache = True
+
+    # Encode the geometry on a process pool with this many workers. 0: in this process.
+    # See encode_parallel().
+    self._workers = 0
+
+    # Acceleration of the machine in mm/s^2, used by estimate().
+    self._accel = 2000
+
+    # A RuidaProfile, that records where write() spends its time. None: no instrumentation.
+    self._profile = None
+
   def addLayer(self, layer):
     self._layers.append(layer)
+    self._header = None
 
-  def set(self, nlayers=None, layer=0, paths=None, speed=None, power=None, globalbbox=None, bbox=None, freq=None, odo=None, color=None, forceabs=None):
+  def set(self, nlayers=None, layer=0, paths=None, speed=None, power=None, globalbbox=None, bbox=None, freq=None, odo=None, color=None, forceabs=None, offsets=None, optimize=None, simplify=None, snap=None, cache=None, workers=None, image=None, dpi=None, profile=None):
     if forceabs   is not None: self._forceabs   = forceabs
+    if profile    is not None: self._profile    = profile or None       # False detaches
+    if workers    is not None: self._workers    = workers
+    if snap       is not None: self._snap       = snap
+    if simplify   is not None: self._simplify   = simplify
+    if optimize   is not None: self._optimize   = optimize
+    if cache      is not None: self._cache      = cache
     if globalbbox is not None: self._globalbbox = globalbbox
     if odo        is not None: self._odo        = odo
 
+    # these change the encoded geometry of all layers.
+    if forceabs is not None or snap is not None or cache is not None or \
+       simplify is not None or optimize is not None:
+      for l in self._layers: l.uncache()
+      self._header = None
+      self._body = None
+    if simplify is not None or optimize is not None:
+      for l in self._layers: l._prepared = False
+    if globalbbox is not None: self._header = None
+    if odo        is not None: self._odo_auto = False
+    if odo        is not None: self._trailer = None
+
     if layer >= len(self._layers): nlayers = layer+1
 
     if nlayers  is not None:
-      if nlayers < len(self._layers): self._layers = self._layers[0:nlayers]
+      if nlayers < len(self._layers):
+        self._layers = self._layers[0:nlayers]
+        self._header = None
       while nlayers > len(self._layers): self.addLayer(RuidaLayer())
 
-    if paths is not None: self._layers[layer].set(paths = paths)
+    if image is not None:
+      l = self._layers[layer]
+      if not isinstance(l, RuidaRasterLayer):
+        # the new layer replaces the old one only, when set_image() succeeds.
+        l = RuidaRasterLayer(speed=l._speed, power=l._power, color=l._color, freq=l._freq)
+        l.set_image(image, dpi=dpi)
+        self._layers[layer] = l
+        self._header = None
+      else:
+        l.set_image(image, dpi=dpi)
+    if paths is not None: self._layers[layer].set(paths = paths, offsets = offsets)
+    elif offsets is not None:
+      l = self._layers[layer]
+      if not isinstance(l._paths, RuidaPathArray): raise ValueError("set(offsets=...) without paths needs a RuidaPathArray layer")
+      l.set(paths = RuidaPathArray(l._paths.xy, offsets))
+    if paths is not None or offsets is not None: self._body = None
     if speed is not None: self._layers[layer].set(speed = speed)
     if power is not None: self._layers[layer].set(power = power)
     if bbox  is not None: self._layers[layer].set(bbox  = bbox)
@@ -154,7 +790,7 @@ class Ruida():
     if color is not None: self._layers[layer].set(color = color)
 
 
-  def write(self, fd, scramble=True):
+  def write(self, fd, scramble=True, profile=None):
     """
     Write a fully prepared object into a file (or raise ValueError()s
     for missing attributes). The object must be prepared by passing
@@ -165,29 +801,106 @@ class Ruida():
     The file format is normally scrambled. Files written with
     scramble=False are not understood by the machine, but may be
     helpful for debugging.
+
+    The data is written in chunks as it is encoded, see write_iter().
+    With a RuidaProfile, the time spent in each phase is recorded.
     """
+    for chunk in self.write_iter(scramble=scramble, profile=profile):
+      fd.write(chunk)
 
-    if not self._header:
-      if self._layers:
-        for l in self._layers:
-          if l._bbox is None and l._paths: l._bbox = self.boundingbox(l._paths)
-      self._header = self.header(self._layers)
+  def write_iter(self, scramble=True, chunksize=0x10000, profile=None):
+    """
+    Generator version of write(). Yields the file contents as bytes chunks
+    of about chunksize, while the layers are encoded. The encoded body is
+    not kept, so that memory use does not grow with the size of the job.
+    The chunks can be written to a file, a socket, or passed to
+    RuidaUdp.write_chunks().
+
+    The bounding boxes needed for the header are computed in a pre-pass over
+    the paths, the odometer for the trailer is summed per layer. Both come
+    from RuidaLayer.stats(), that is one pass over the paths, cached for
+    later writes.
+
+    With _cache (the default), the encoded geometry of each layer is kept,
+    and only layers changed by set() are encoded again on the next call.
+    The header is rebuilt, if any layer is dirty. set(cache=False) keeps
+    memory use flat for huge jobs, each write() then encodes all layers again.
+    Either way, simplify() and optimize() only run once on the paths of a
+    layer, until set() changes them.
+
+    profile is a RuidaProfile, default: the one attached with set(). The time
+    between chunks, while the consumer works, is accounted as phase 'io'.
+    """
+    if profile is None: profile = self._profile
+    if profile:
+      profile.writes += 1
+      t = profile.clock()
     if not self._body:
+      cached = [l._geometry is not None for l in self._layers]     # before encode_parallel() fills them
+      todo = [l for l in self._layers if l._geometry is None]
+      fresh = [l for l in todo if not l._prepared]
+      if self._simplify and fresh:
+        if self._simplify is True: self.simplify(layers=fresh)
+        else:                      self.simplify(self._simplify, layers=fresh)
+      if self._optimize and fresh:
+        if isinstance(self._optimize, dict): self.optimize(layers=fresh, **self._optimize)
+        else:                                self.optimize(layers=fresh)
+      for l in fresh: l._prepared = True
+      if self._workers and todo: self.encode_parallel(todo)
+      if profile:
+        t = profile.add('prepare', t)
+        for lnum in range(len(self._layers)): profile.layer(lnum, self._layers[lnum], cached[lnum])
+        t = profile.add('stats', t)
+    for l in self._layers:
+      if l._dirty: self._header = None
+    if not self._header:
       if self._layers:
-        self._body = self.body(self._layers)
-    if not self._odo:
-      if self._layers:
-        for l in self._layers:
-          self.odoAdd(self.odometer(l._paths))
-    if not self._trailer: self._trailer = self.trailer(self._odo)
-
+        self._header = self.header(self._layers)
+        for l in self._layers: l._dirty = False
     if not self._header:  raise ValueError("header(_bbox,_speed,_power,_freq) not initialized")
-    if not self._body:    raise ValueError("body(_layers) not initialized")
-    if not self._trailer: raise ValueError("trailer() not initialized")
+    if not self._body and not self._layers: raise ValueError("body(_layers) not initialized")
+
+    codec = lambda x: x
+    if scramble: codec = self.scramble_bytes
+    if profile: t = profile.add('header', t, self._header)
+    chunk = codec(self._header)
+    if profile: t = profile.add('scramble', t)
+    yield chunk
+    if profile: t = profile.add('io', t)
+
+    # summed locally, so that an abandoned write leaves no partial odometer behind.
+    need_odo = not self._odo or self._odo_auto
+    odo = None
+    if self._body:
+      chunk = codec(self._body)
+      if profile: t = profile.add('scramble', t)
+      yield chunk
+      if profile: t = profile.add('io', t)
+    for lnum in range(len(self._layers)):
+      if not self._body:
+        for chunk in self.body_iter(self._layers, chunksize=chunksize, lnums=[lnum]):
+          if profile: t = profile.add('body', t, chunk, lnum)
+          chunk = codec(chunk)
+          if profile: t = profile.add('scramble', t)
+          yield chunk
+          if profile: t = profile.add('io', t)
+      if need_odo:
+        o = self._layers[lnum].stats().odometer()
+        odo = list(o) if odo is None else [odo[n] + o[n] for n in range(len(o))]
+      if not self._cache: self._layers[lnum]._geometry = None     # from encode_parallel()
+    if need_odo:
+      self._odo = odo
+      self._odo_auto = True
+      self._trailer = None
+    if profile: t = profile.add('odometer', t)
 
-    contents = self._header + self._body + self._trailer
-    if scramble: contents = self.scramble_bytes(contents)
-    fd.write(contents)
+    if not self._trailer: self._trailer = self.trailer(self._odo)
+    if not self._trailer: raise ValueError("trailer() not initialized")
+    if profile: t = profile.add('trailer', t, self._trailer)
+    chunk = codec(self._trailer)
+    if profile: t = profile.add('scramble', t)
+    yield chunk
+    if profile: profile.add('io', t)
 
   def odometer(self, paths=None, init=[0,0], return_home=False):
     """
@@ -197,6 +910,8 @@ class Ruida():
     """
     if paths is None: paths = self._paths
     if paths is None: raise ValueError("no paths")
+    if isinstance(paths, RuidaPathArray) or (isinstance(paths, RuidaPathStore) and numpy is not None):
+      return paths.odometer(init, return_home)
 
     def dist_xy(p1, p2):
       dx = p2[0] - p1[0]
@@ -220,6 +935,222 @@ class Ruida():
       trav_d += dist_xy(xy, init)
     return [ cut_d, trav_d ]
 
+  def estimate(self, layers=None, accel=None):
+    """
+    Predicts the size of the .rd file and the duration of the job, without
+    encoding the geometry. Call it after optimize() and simplify(), write()
+    would otherwise apply them first.
+
+    Returns { 'bytes':N, 'seconds':T, 'cut':mm, 'travel':mm, 'layers':[ {...}, ...] }
+    with the same keys per layer, except 'bytes' there is the geometry only.
+
+    The byte count is exact: header, layer prologs and trailer are built as
+    for write(), the geometry is counted from the instruction choice, see
+    geometry_size(), or taken from the cache. Without numpy, the geometry is
+    encoded to count it.
+
+    The duration is an estimate, see runtime(). Each layer is timed from [0,0],
+    like odometer(), with _snap on the micrometer grid. Size and duration
+    share one pass of path_deltas() per layer, cut and travel come from the
+    cached RuidaLayer.stats(). Nested lists are converted to a RuidaPathArray
+    once, for all three.
+    """
+    if layers is None: layers = self._layers
+    if accel is None: accel = self._accel
+    res = { 'bytes':0, 'seconds':0.0, 'cut':0.0, 'travel':0.0, 'layers':[] }
+    for lnum in range(len(layers)):
+      l = layers[lnum]
+      paths = l._paths
+      if numpy is not None and paths and not isinstance(paths, (RuidaPathArray, RuidaPathStore)):
+        paths = RuidaPathArray.from_paths(paths)
+        if l._stats is None: l._stats = RuidaLayerStats(paths)
+      deltas = self.path_deltas(paths) if numpy is not None and paths else None
+
+      if l._geometry is not None:   size = sum([len(b) for b in l._geometry])
+      elif not paths:               size = 0
+      else:                         size = self.geometry_size(paths, deltas=deltas)
+
+      speed = l._speed
+      if type(speed) == float or type(speed) == int: speed = [1000, speed]
+      st = l.stats()
+      lres = { 'bytes':size, 'seconds':self.runtime(paths, speed, accel, deltas) if paths else 0.0, 'cut':st.cut, 'travel':st.travel }
+      res['layers'].append(lres)
+      res['bytes'] += size + len(self.layer_prolog(l, lnum))
+      for key in ('seconds', 'cut', 'travel'): res[key] += lres[key]
+    if layers: res['bytes'] += len(self.header(layers))
+    res['bytes'] += len(self.trailer([0, 0]))
+    return res
+
+  def runtime(self, paths, speed, accel=None, deltas=None, blocksize=0x4000):
+    """
+    Estimated duration in seconds of the moves and cuts of one layer, using
+    a trapezoidal speed profile on every segment: accelerate with accel
+    from the entry speed to speed[0] (travel) or speed[1] (cut), cruise,
+    and decelerate to the exit speed.
+
+    The head stops at the start and end of each path. At a corner between
+    two cuts it slows down to speed[1] * (1 + cos(angle))/2, that is full
+    speed straight on, half speed at a right angle and a stop when turning
+    back. The corner speed is also limited to what can be reached from
+    standstill on the shorter neighbouring segment.
+
+    paths is a RuidaPathArray, a RuidaPathStore (or anything
+    RuidaPathArray.from_paths() takes). deltas are those of path_deltas(),
+    if already at hand. Needs numpy.
+    """
+    if numpy is None: raise ImportError("runtime() needs numpy")
+    if accel is None: accel = self._accel
+    if deltas is None:
+      if not isinstance(paths, (RuidaPathArray, RuidaPathStore)): paths = RuidaPathArray.from_paths(paths)
+      deltas = self.path_deltas(paths, False)
+    travel, x, y, dx, dy = deltas
+    n = len(dx)
+    if n == 0: return 0.0
+    if dx.dtype.kind == 'i':
+      dx = dx / 1000.0          # micrometers
+      dy = dy / 1000.0
+
+    # segment i ends at vertex i, segment 0 comes from [0,0]. In blocks, so that
+    # the temporaries stay small: their allocation would cost more than the math.
+    total = 0.0
+    for b in range(0, n, blocksize):
+      e = min(b + blocksize, n)
+      # one more segment on each side, for the junctions at the ends of the block.
+      lo = max(b - 1, 0)
+      hi = min(e + 1, n)
+      bdx = dx[lo:hi]
+      bdy = dy[lo:hi]
+      L = numpy.sqrt(bdx*bdx + bdy*bdy)
+
+      # vj[k]: the junction speed between segment k-1 and k, the ends are stops.
+      vj = numpy.zeros(hi - lo + 1)
+      tr = travel[lo:hi]
+      L0 = L[:-1]
+      L1 = L[1:]
+      LL = L0 * L1
+      both = ~(tr[:-1] | tr[1:]) & (LL > 0)
+      cos = (bdx[:-1]*bdx[1:] + bdy[:-1]*bdy[1:]) / numpy.maximum(LL, 1e-300)
+      vj[1:-1] = numpy.minimum(float(speed[1]) * (1 + cos) / 2, numpy.sqrt(accel * numpy.minimum(L0, L1))) * both
+
+      # the segments of this block.
+      L = L[b-lo:e-lo]
+      v0 = vj[b-lo:e-lo]
+      v1 = vj[b-lo+1:e-lo+1]
+      vmax = numpy.where(tr[b-lo:e-lo], float(speed[0]), float(speed[1]))
+
+      # the peak speed v: accelerate from v0 and decelerate to v1 within L, capped at vmax.
+      # The corner limit above keeps v >= v0, v1. The trapezoid then takes the time of
+      # L at speed v plus the time lost in accelerating and decelerating.
+      v = numpy.minimum(vmax, numpy.sqrt(accel * L + (v0*v0 + v1*v1) / 2))
+      e0 = v - v0
+      e1 = v - v1
+      total += float(((L + (e0*e0 + e1*e1) / (2*accel)) / numpy.maximum(v, 1e-9)).sum())
+    return total
+
+  def optimize(self, layers=None, window=25, passes=2, rotate=False, reverse=False):
+    """
+    Reorder the paths of each layer, so that the travel moves between them
+    get shorter. Lower layers are still processed first.
+    See ruidaoptimize.order_paths() for window and passes.
+
+    rotate=True lets closed paths (first point equals last point) start at
+    the vertex closest to the current head position.
+    reverse=True cuts open paths backwards, if their far end is closer.
+
+    Returns a list of two odometer() values [ before, after ], summed over
+    all layers. Only the travel distance changes.
+    Cached _body, _odo and _trailer are cleared.
+    """
+    if layers is None: layers = self._layers
+    before = [0, 0]
+    after = [0, 0]
+    for l in layers:
+      if not l._paths or isinstance(l, RuidaRasterLayer): continue
+      odo = l.stats().odometer()
+      before = [before[0]+odo[0], before[1]+odo[1]]
+      plan = ruidaoptimize.order_paths(l._paths, window=window, passes=passes, rotate=rotate, reverse=reverse)
+      if isinstance(l._paths, (RuidaPathArray, RuidaPathStore)):
+        l.set(paths=l._paths.reorder(plan))
+      else:
+        l.set(paths=ruidaoptimize.apply_plan(l._paths, plan))
+      odo = l.stats().odometer()
+      after = [after[0]+odo[0], after[1]+odo[1]]
+    self._body = None
+    self._odo = None
+    self._trailer = None
+    return [ before, after ]
+
+  def simplify(self, tolerance=None, layers=None):
+    """
+    Remove vertices from the paths of each layer, that deviate less than
+    tolerance mm from the simplified line (Douglas-Peucker). First and last
+    point of each path are kept. The default tolerance is a quarter of the
+    beam diameter _beam. This leaves room for the rounding loss, that
+    _forceabs limits.
+
+    With numpy, all paths of a layer are simplified at once, vectorized.
+    Layers of nested lists are converted to a RuidaPathArray for this, and
+    keep that form.
+
+    Returns { 'vertices': [ before, after ], 'bytes': [ before, after ] },
+    summed over all layers. The bytes are the encoded geometry, without the
+    layer prologs.
+    Cached _body, _odo and _trailer are cleared. The bounding boxes remain
+    valid, as no new points are introduced.
+    """
+    if tolerance is None: tolerance = 0.25 * self._beam
+    if layers is None: layers = self._layers
+    res = { 'vertices': [0, 0], 'bytes': [0, 0] }
+    for l in layers:
+      if not l._paths or isinstance(l, RuidaRasterLayer): continue
+      if numpy is not None and not isinstance(l._paths, (RuidaPathArray, RuidaPathStore)):
+        l.set(paths=RuidaPathArray.from_paths(l._paths))      # converted once, encoded vectorized later.
+      for i in (0, 1):
+        if i: l.set(paths=self.simplify_paths(l._paths, tolerance))
+        res['vertices'][i] += l.stats().vertices
+        res['bytes'][i] += self.geometry_size(l._paths)
+    self._body = None
+    self._odo = None
+    self._trailer = None
+    return res
+
+  def simplify_paths(self, paths, tolerance):
+    """ see simplify(), returns the simplified paths. """
+    def kept(keep, o):
+      " the offsets of the paths after dropping the vertices not in keep "
+      count = numpy.add.reduceat(keep, o[:-1]) if len(keep) else numpy.zeros(len(o) - 1, dtype=numpy.int64)
+      count[o[:-1] >= o[1:]] = 0      # empty paths
+      return numpy.concatenate([[0], numpy.cumsum(count)[:-1]])
+
+    if isinstance(paths, RuidaPathStore):
+      if numpy is None: return RuidaPathStore([ruidaoptimize.simplify_path(p, tolerance) for p in paths])
+      # simplified in micrometers, on the integer data of the store.
+      m = paths.microns()
+      o = paths.offset_array()
+      keep = ruidaoptimize.simplify_array(m, o, tolerance * 1000)
+      return RuidaPathStore.from_microns(m[keep], kept(keep, o))
+    if isinstance(paths, RuidaPathArray):
+      keep = ruidaoptimize.simplify_array(paths.xy, paths.offsets, tolerance)
+      return RuidaPathArray(paths.xy[keep], kept(keep, paths.offsets))
+    if numpy is not None: return self.simplify_paths(RuidaPathArray.from_paths(paths), tolerance)
+    return [ruidaoptimize.simplify_path(p, tolerance) for p in paths]
+
+  def geometry_size(self, paths, snap=None, deltas=None):
+    """
+    The number of bytes encode_geometry() emits for paths, counted from the
+    instruction choice of path_array_rel(): absolute 11 bytes, relative 5,
+    horizontal or vertical 3. deltas are those of path_deltas(), if already
+    at hand. Without numpy, the geometry is encoded to count it.
+    """
+    if numpy is None: return sum([len(b) for b in self.encode_geometry(paths)])
+    if deltas is None:
+      if not isinstance(paths, (RuidaPathArray, RuidaPathStore)): paths = RuidaPathArray.from_paths(paths)
+      deltas = self.path_deltas(paths, snap)
+    travel, x, y, dx, dy = deltas
+    rel = self.path_array_rel(dx, dy)
+    hv = rel & ((dx == 0) | (dy == 0))
+    return 11 * len(rel) - 6 * int(numpy.count_nonzero(rel)) - 2 * int(numpy.count_nonzero(hv))
+
   def odoAdd(self, odo):
     if self._odo is None:
       self._odo = copy.copy(odo)        # we change values later. Thus we need a copy.
@@ -249,6 +1180,7 @@ class Ruida():
     """
     if paths is None: paths = self._paths
     if paths is None: raise ValueError("no paths")
+    if isinstance(paths, (RuidaPathArray, RuidaPathStore)): return paths.boundingbox()
     xmin = xmax = paths[0][0][0]
     ymin = ymax = paths[0][0][1]
     for path in paths:
@@ -288,6 +1220,190 @@ class Ruida():
 
     Returns the binary instruction data.
     """
+    return b''.join(self.body_iter(layers))
+
+  def body_iter(self, layers, chunksize=None, lnums=None):
+    """
+    Generator version of body(). Yields the binary instruction data in
+    chunks of at least chunksize bytes (the last one may be shorter).
+    Without chunksize, one chunk per layer is returned.
+
+    lnums restricts the output to the given layer numbers. Layer numbers
+    are always the index into layers.
+
+    The prolog and, with _cache, the geometry of each layer are cached in
+    the RuidaLayer, see RuidaLayer.set().
+    """
+
+    if lnums is None: lnums = range(len(layers))
+    # for lnum in reversed(range(len(layers))):         # Can be permuted, lower lnum's are processed first. Always.
+    for lnum in lnums:
+      l = layers[lnum]
+      data = bytearray()        # append-only. bytes += bytes would be quadratic.
+      data += self.layer_prolog(l, lnum)
+
+      geometry = l._geometry
+      if geometry is None:
+        geometry = self.encode_geometry(l._paths)
+        if self._cache: geometry = self._cache_geometry(l, geometry)
+      for block in geometry:
+        data += block
+        if chunksize and len(data) >= chunksize:
+          yield bytes(data)
+          del data[:]
+      if data: yield bytes(data)
+
+  def encode_parallel(self, layers=None, workers=None, minpart=20000):
+    """
+    Encode the geometry of the layers on a pool of worker processes and
+    store it in the layers, where body_iter() picks it up.
+
+    Large layers are cut into parts of at least minpart vertices. A cut is
+    only placed before a path, that starts with an absolute move anyway
+    (too far from the end of the previous path for a relative move). There
+    the encoder starts from scratch, just like a fresh layer. Thus the
+    joined parts are identical to a serial encoding.
+    """
+    if futures is None: raise ImportError("encode_parallel needs concurrent.futures")
+    if workers is None: workers = self._workers
+    if layers is None: layers = self._layers
+    layers = [l for l in layers if l._paths]
+    if not layers: return
+    total = sum([l.stats().vertices for l in layers])
+    minpart = max(minpart, total // (4 * workers) + 1)
+
+    jobs = []
+    counts = []
+    for l in layers:
+      split = self.split_paths(l._paths, minpart)
+      jobs += [(self._forceabs, self._snap, part) for part in split]
+      counts.append(len(split))
+
+    pool = futures.ProcessPoolExecutor(max_workers=workers)
+    try:
+      parts = list(pool.map(_encode_part, jobs))
+    finally:
+      pool.shutdown()
+    for l, n in zip(layers, counts):
+      l._geometry = [p for p in parts[:n] if p]
+      parts = parts[n:]
+
+  def split_paths(self, paths, minpart):
+    """
+    Cut paths into a list of parts with about minpart vertices each, see
+    encode_parallel(). Each part starts with a path, that the encoder
+    reaches with an absolute move. A RuidaPathArray or RuidaPathStore is cut
+    into the same type.
+    """
+    snap = self._snap or isinstance(paths, RuidaPathStore)
+    starts = [0]
+    count = 0
+    last = None
+    for i in range(len(paths)):
+      path = paths[i]
+      if not len(path): continue
+      if count >= minpart and last is not None:
+        p = path[0]
+        if snap:
+          far = max(abs(int(round(p[0]*1000)) - int(round(last[0]*1000))),
+                    abs(int(round(p[1]*1000)) - int(round(last[1]*1000)))) > 8191
+        else:
+          far = max(abs(p[0]-last[0]), abs(p[1]-last[1])) > 8.191
+        if far:
+          starts.append(i)
+          count = 0
+      count += len(path)
+      last = path[-1]
+    starts.append(len(paths))
+    if isinstance(paths, (RuidaPathArray, RuidaPathStore)):
+      return [paths.subset(starts[k], starts[k+1]) for k in range(len(starts)-1)]
+    return [paths[starts[k]:starts[k+1]] for k in range(len(starts)-1)]
+
+  def _cache_geometry(self, l, geometry):
+    """ pass through the geometry blocks, keep them in l, when all are seen. """
+    blocks = []
+    for block in geometry:
+      block = bytes(block)
+      blocks.append(block)
+      yield block
+    l._geometry = blocks
+
+  def layer_prolog(self, l, lnum):
+    """
+    Returns the body prolog of layer l, which sets speed and powers.
+    The result is cached in l until its speed or power change.
+    """
+    if l._prolog is not None and l._prolog[0] == lnum: return l._prolog[1]
+    data = bytearray()
+
+    # CAUTION: keep in sync with header()
+    power = copy.copy(l._power)
+    if len(power) % 2: raise ValueError("Even number of elements needed in power[]")
+    while len(power) < 8: power += power[-2:]
+
+    speed = copy.copy(l._speed)
+    if type(speed) == float or type(speed) == int: speed = [1000, speed]
+    travelspeed = speed[0]
+    laserspeed = speed[1]
+
+    ################## Body Prolog Start #######################
+    data += self.enc('-b-', ["""
+        ca 01 00                                        # Flags_CA_01 00
+        ca 02""", lnum, """                             # CA 02 Layer:0 priority?
+        ca 01 30                                        # Flags_CA_01 30
+        ca 01 10                                        # Flags_CA_01 10
+        ca 01 13                                        # Blow_on
+        """])
+
+    ##   '-p-p-p-p-'
+    #    c6 12 00 00 00 00 00            # Cut_Open_delay_12 0.0 ms
+    #    c6 13 00 00 00 00 00            # Cut_Close_delay_13 0.0 ms
+    #    c6 50 """, 100, """             # Cut_through_power1 100%
+    #    c6 51 """, 100, """             # Cut_through_power2 100%
+    #    c6 55 """, 100, """             # Cut_through_power3 100%
+    #    c6 56 """, 100, """             # Cut_through_power4 100%
+    ## if the Cut_through_powers are not present, then c6 15 and c6 16 instead.
+
+    data += self.enc('-n-p-p-p-p-p-p-p-p-', ["""
+        c9 02 """, laserspeed, """      # Speed_C9 30.0mm/s
+        c6 15 00 00 00 00 00            # Cut_Open_delay_12 0.0 ms
+        c6 16 00 00 00 00 00            # Cut_Close_delay_13 0.0 ms
+        c6 01 """, power[0], """        # Laser_1_Min_Pow_C6_01 0%
+        c6 02 """, power[1], """        # Laser_1_Max_Pow_C6_02 0%
+        c6 21 """, power[2], """        # Laser_2_Min_Pow_C6_21 0%
+        c6 22 """, power[3], """        # Laser_2_Max_Pow_C6_22 0%
+        c6 05 """, power[4], """        # Laser_3_Min_Pow_C6_05 1%
+        c6 06 """, power[5], """        # Laser_3_Max_Pow_C6_06 0%
+        c6 07 """, power[6], """        # Laser_4_Min_Pow_C6_07 0%
+        c6 08 """, power[7], """        # Laser_4_Max_Pow_C6_08 0%
+        ca 03 01                        # Layer_CA_03 01
+        ca 10 00                        # CA 10 00
+        """])
+    ################## Body Prolog End #######################
+
+    l._prolog = (lnum, bytes(data))
+    return l._prolog[1]
+
+  def encode_geometry(self, paths, blocksize=0x10000):
+    """
+    Encode the paths of one layer with the method matching their type.
+    A RuidaPathStore is already on the micrometer grid and is always encoded
+    exactly, as with _snap.
+    """
+    if isinstance(paths, RuidaPathStore):
+      if numpy is not None: return self.encode_path_array(paths, blocksize)
+      return self.encode_paths_snapped(paths, blocksize)
+    if isinstance(paths, RuidaPathArray): return self.encode_path_array(paths, blocksize)
+    if self._snap: return self.encode_paths_snapped(paths, blocksize)
+    return self.encode_paths(paths, blocksize)
+
+  def encode_paths(self, paths, blocksize=0x10000):
+    """
+    Encode the paths of one layer into move and cut instructions.
+    The first point of each path is reached with a move, the others with cuts.
+
+    Yields the geometry instructions of blocks of blocksize vertices.
+    """
 
     def relok(last, point):
       """
@@ -302,130 +1418,253 @@ class Ruida():
       dy = abs(point[1]-last[1])
       return max(dx, dy) <= maxrel
 
-    data = bytes([])
-    # for lnum in reversed(range(len(layers))):         # Can be permuted, lower lnum's are processed first. Always.
-    for lnum in range(len(layers)):
-      l = layers[lnum]
+    # per vertex instructions. Templates are compiled here, outside of the loop.
+    enc = self.enc_compiled
+    t_move_horiz = self.enc_template(('-r',  '8a'))
+    t_cut_horiz  = self.enc_template(('-r',  'aa'))
+    t_move_vert  = self.enc_template(('-r',  '8b'))
+    t_cut_vert   = self.enc_template(('-r',  'ab'))
+    t_move_rel   = self.enc_template(('-rr', '89'))
+    t_cut_rel    = self.enc_template(('-rr', 'a9'))
+    t_move_abs   = self.enc_template(('-nn', '88'))
+    t_cut_abs    = self.enc_template(('-nn', 'a8'))
+
+    data = bytearray()
+    count = 0
+    relcounter = 0
+    lp = None
+    for path in paths:
+      travel = True
+      for p in path:
+        if relok(lp, p) and (self._forceabs == 0 or relcounter < self._forceabs):
 
-      # CAUTION: keep in sync with header()
-      power = copy.copy(l._power)
-      if len(power) % 2: raise ValueError("Even number of elements needed in power[]")
-      while len(power) < 8: power += power[-2:]
+          if self._forceabs > 0: relcounter += 1
 
-      speed = copy.copy(l._speed)
-      if type(speed) == float or type(speed) == int: speed = [1000, speed]
-      travelspeed = speed[0]
-      laserspeed = speed[1]
+          if p[1] == lp[1]:     # horizontal rel
+            if travel:
+              data += enc(t_move_horiz, ('8a', p[0]-lp[0]))   # Move_Horiz 6.213mm
+            else:
+              data += enc(t_cut_horiz, ('aa', p[0]-lp[0]))    # Cut_Horiz -6.008mm
+          elif p[0] == lp[0]:   # vertical rel
+            if travel:
+              data += enc(t_move_vert, ('8b', p[1]-lp[1]))    # Move_Vert 17.1mm
+            else:
+              data += enc(t_cut_vert, ('ab', p[1]-lp[1]))     # Cut_Vert 2.987mm
+          else:                 # other rel
+            if travel:
+              data += enc(t_move_rel, ('89', p[0]-lp[0], p[1]-lp[1]))   # Move_To_Rel 3.091mm 0.025mm
+            else:
+              data += enc(t_cut_rel, ('a9', p[0]-lp[0], p[1]-lp[1]))    # Cut_Rel 0.015mm -1.127mm
 
-      ################## Body Prolog Start #######################
-      data += self.enc('-b-', ["""
-          ca 01 00                                        # Flags_CA_01 00
-          ca 02""", lnum, """                             # CA 02 Layer:0 priority?
-          ca 01 30                                        # Flags_CA_01 30
-          ca 01 10                                        # Flags_CA_01 10
-          ca 01 13                                        # Blow_on
-          """])
-
-      ##   '-p-p-p-p-'
-      #    c6 12 00 00 00 00 00            # Cut_Open_delay_12 0.0 ms
-      #    c6 13 00 00 00 00 00            # Cut_Close_delay_13 0.0 ms
-      #    c6 50 """, 100, """             # Cut_through_power1 100%
-      #    c6 51 """, 100, """             # Cut_through_power2 100%
-      #    c6 55 """, 100, """             # Cut_through_power3 100%
-      #    c6 56 """, 100, """             # Cut_through_power4 100%
-      ## if the Cut_through_powers are not present, then c6 15 and c6 16 instead.
-
-      data += self.enc('-n-p-p-p-p-p-p-p-p-', ["""
-          c9 02 """, laserspeed, """      # Speed_C9 30.0mm/s
-          c6 15 00 00 00 00 00            # Cut_Open_delay_12 0.0 ms
-          c6 16 00 00 00 00 00            # Cut_Close_delay_13 0.0 ms
-          c6 01 """, power[0], """        # Laser_1_Min_Pow_C6_01 0%
-          c6 02 """, power[1], """        # Laser_1_Max_Pow_C6_02 0%
-          c6 21 """, power[2], """        # Laser_2_Min_Pow_C6_21 0%
-          c6 22 """, power[3], """        # Laser_2_Max_Pow_C6_22 0%
-          c6 05 """, power[4], """        # Laser_3_Min_Pow_C6_05 1%
-          c6 06 """, power[5], """        # Laser_3_Max_Pow_C6_06 0%
-          c6 07 """, power[6], """        # Laser_4_Min_Pow_C6_07 0%
-          c6 08 """, power[7], """        # Laser_4_Max_Pow_C6_08 0%
-          ca 03 01                        # Layer_CA_03 01
-          ca 10 00                        # CA 10 00
-          """])
-      ################## Body Prolog End #######################
-
-      relcounter = 0
-      lp = None
-      for path in l._paths:
-        travel = True
-        for p in path:
-          if relok(lp, p) and (self._forceabs == 0 or relcounter < self._forceabs):
-
-            if self._forceabs > 0: relcounter += 1
-
-            if p[1] == lp[1]:     # horizontal rel
-              if travel:
-                data += self.enc('-r', ['8a', p[0]-lp[0]])   # Move_Horiz 6.213mm
-              else:
-                data += self.enc('-r', ['aa', p[0]-lp[0]])   # Cut_Horiz -6.008mm
-            elif p[0] == lp[0]:   # vertical rel
-              if travel:
-                data += self.enc('-r', ['8b', p[1]-lp[1]])   # Move_Vert 17.1mm
-              else:
-                data += self.enc('-r', ['ab', p[1]-lp[1]])   # Cut_Vert 2.987mm
-            else:                 # other rel
-              if travel:
-                data += self.enc('-rr', ['89', p[0]-lp[0], p[1]-lp[1]])   # Move_To_Rel 3.091mm 0.025mm
-              else:
-                data += self.enc('-rr', ['a9', p[0]-lp[0], p[1]-lp[1]])   # Cut_Rel 0.015mm -1.127mm
+        else:
+
+          relcounter = 0
 
+          if travel:
+            data += enc(t_move_abs, ('88', p[0], p[1]))     # Move_To_Abs 0.0mm 0.0mm
           else:
+            data += enc(t_cut_abs, ('a8', p[0], p[1]))      # Cut_Abs_a8 17.415mm 7.521mm
 
-            relcounter = 0
+        lp = p
+        travel = False
 
-            if travel:
-              data += self.enc('-nn', ['88', p[0], p[1]])               # Move_To_Abs 0.0mm 0.0mm
-            else:
-              data += self.enc('-nn', ['a8', p[0], p[1]])               # Cut_Abs_a8 17.415mm 7.521mm
+        count += 1
+        if count >= blocksize:
+          yield bytes(data)
+          del data[:]
+          count = 0
+    if data: yield bytes(data)
 
-          lp = p
-          travel = False
-    return data
+  def encode_paths_snapped(self, paths, blocksize=0x10000):
+    """
+    Variant of encode_paths() used with _snap: All vertices are rounded to the
+    micrometer grid first, relative instructions encode the integer differences.
+    Nothing is lost in rounding, the position on the machine never drifts.
+    Thus absolute instructions are only needed for distances beyond 8.191mm,
+    _forceabs is ignored.
+
+    Yields the geometry instructions of blocks of blocksize vertices.
+    """
+    data = bytearray()
+    count = 0
+    lx = ly = None
+    for path in paths:
+      op = 0x88                 # travel to the first point, cut the rest.
+      for p in path:
+        x = int(round(p[0] * 1000))
+        y = int(round(p[1] * 1000))
+        if lx is not None and abs(x-lx) <= 8191 and abs(y-ly) <= 8191:
+          dx = (x-lx) % 16384   # 14 bit 2s complement
+          dy = (y-ly) % 16384
+          if y == ly:   data += bytes([op+2, dx>>7, dx&0x7f])                      # Move_Horiz / Cut_Horiz
+          elif x == lx: data += bytes([op+3, dy>>7, dy&0x7f])                      # Move_Vert / Cut_Vert
+          else:         data += bytes([op+1, dx>>7, dx&0x7f, dy>>7, dy&0x7f])      # Move_To_Rel / Cut_Rel
+        else:
+          data += bytes([op]) + self.encode_number(x, scale=1) + self.encode_number(y, scale=1)   # Move_To_Abs / Cut_Abs
+        lx = x
+        ly = y
+        op = 0xa8
+
+        count += 1
+        if count >= blocksize:
+          yield bytes(data)
+          del data[:]
+          count = 0
+    if data: yield bytes(data)
+
+  def path_deltas(self, pa, snap=None):
+    """
+    The coordinate differences, from which path_array_ops() chooses the
+    instructions. pa is a RuidaPathArray or RuidaPathStore. Returns numpy
+    arrays with one entry per vertex: travel: True for the first vertex of
+    each path, x, y: the coordinates, dx, dy: the differences to the previous
+    vertex, dx[0], dy[0] from [0,0].
+
+    With snap, and always for a RuidaPathStore, x, y, dx, dy are integer
+    micrometers, else floats in mm.
+    """
+    if snap is None: snap = self._snap
+    if isinstance(pa, RuidaPathStore):
+      m = pa.microns()
+      x = m[:,0]
+      y = m[:,1]
+      offsets = pa.offset_array()
+    else:
+      x = pa.xy[:,0]
+      y = pa.xy[:,1]
+      if snap:
+        x = numpy.round(x * 1000).astype(numpy.int64)
+        y = numpy.round(y * 1000).astype(numpy.int64)
+      offsets = pa.offsets
+    n = len(x)
+    travel = numpy.zeros(n, dtype=bool)
+    travel[offsets[:-1][offsets[:-1] < n]] = True
+    dx = numpy.empty(n, dtype=x.dtype)
+    dy = numpy.empty(n, dtype=y.dtype)
+    if n:
+      dx[0] = x[0]
+      dy[0] = y[0]
+      numpy.subtract(x[1:], x[:-1], out=dx[1:])
+      numpy.subtract(y[1:], y[:-1], out=dy[1:])
+    return travel, x, y, dx, dy
+
+  def path_array_rel(self, dx, dy, blocksize=0x4000):
+    """
+    relok() for all vertices, from the differences of path_deltas(): True
+    where a relative instruction is used. The first vertex is always absolute.
+    Float differences are subject to the _forceabs counter: each run of
+    relative moves gets every (_forceabs+1)th vertex absolute. Integer
+    micrometers are exact and need no counter.
+    """
+    exact = dx.dtype.kind == 'i'
+    limit = 8191 if exact else 8.191
+    rel = numpy.empty(len(dx), dtype=bool)
+    if not len(rel): return rel
+    for b in range(0, len(dx), blocksize):        # small temporaries, see runtime()
+      s = slice(b, b+blocksize)
+      numpy.less_equal(numpy.maximum(numpy.abs(dx[s]), numpy.abs(dy[s])), limit, out=rel[s])
+    rel[0] = False
+    if not exact and self._forceabs > 0:
+      # the runs of relative moves, and the vertices where their relcounter overflows.
+      # rel[0] is False, thus the changes alternate between start and end of a run.
+      f = self._forceabs + 1
+      edges = numpy.flatnonzero(rel[1:] != rel[:-1]) + 1
+      if len(edges) % 2: edges = numpy.append(edges, len(rel))
+      start = edges[0::2]
+      k = (edges[1::2] - start) // f
+      if k.any():
+        first = numpy.repeat(numpy.cumsum(k) - k, k)
+        rel[numpy.repeat(start - 1, k) + f * (numpy.arange(int(k.sum())) - first + 1)] = False
+    return rel
+
+  def path_array_ops(self, pa, snap=None):
+    """
+    The instruction choice of encode_path_array(). Returns numpy arrays with
+    one entry per vertex of the RuidaPathArray pa:
+    travel, rel, horiz, vert, other: booleans, the kind of instruction,
+    nx, ny: absolute coordinates, rx, ry: relative coordinates in micrometers.
 
+    pa can also be a RuidaPathStore, that is always snapped. nx, ny are then
+    views on its integer data.
+    """
+    travel, x, y, dx, dy = self.path_deltas(pa, snap)
+    rel = self.path_array_rel(dx, dy)
+    horiz = rel & (dy == 0)
+    vert  = rel & ~horiz & (dx == 0)
+    other = rel & ~horiz & ~vert
+
+    # nx, ny: absolute coordinates, rx, ry: relative coordinates in micrometers.
+    if dx.dtype.kind == 'i':
+      return travel, rel, horiz, vert, other, x, y, dx, dy
+    # encode_number() and encode_relcoord() truncate.
+    nx = (x * 1000).astype(numpy.int64)
+    ny = (y * 1000).astype(numpy.int64)
+    rx = (dx * 1000).astype(numpy.int64)
+    ry = (dy * 1000).astype(numpy.int64)
+    return travel, rel, horiz, vert, other, nx, ny, rx, ry
+
+  def encode_path_array(self, pa, blocksize=0x10000, snap=None):
+    """
+    Vectorized variant of encode_paths() and encode_paths_snapped() for a
+    RuidaPathArray. The relok() test, the _forceabs counter, the choice of
+    horizontal/vertical/other relative or absolute instructions and the
+    7-bit number encoding are computed with numpy for all vertices at once.
+
+    Yields the geometry instructions of blocks of blocksize vertices.
+    The output is identical to what encode_paths() (or encode_paths_snapped()
+    with _snap) emits for the same paths as lists. snap overrides _snap.
+    """
+    if not len(pa.xy): return
+    travel, rel, horiz, vert, other, nx, ny, rx, ry = self.path_array_ops(pa, snap)
+    n = len(travel)
+
+    # opcode: 0x88 Move_To_Abs, 0x89 Move_To_Rel, 0x8a Move_Horiz, 0x8b Move_Vert, +0x20 for cuts.
+    op = numpy.where(travel, 0x88, 0xa8) + numpy.where(horiz, 2, numpy.where(vert, 3, numpy.where(other, 1, 0)))
+    length = numpy.where(rel, numpy.where(other, 5, 3), 11)
+
+    def b128(v, ndigits):
+      " encode_number(): big endian 7-bit digits, one row per value "
+      shifts = numpy.arange(7*(ndigits-1), -1, -7)
+      return ((v[:,None] >> shifts) & 0x7f).astype(numpy.uint8)
+
+    def relcoord(nn):
+      " encode_relcoord(): 14 bit 2s complement "
+      return b128(numpy.where(nn < 0, nn + 16384, nn), 2)
+
+    def abscoord(nn):
+      " encode_number(): negative values encode as 0 "
+      if (nn >= 1<<35).any(): raise ValueError("abscoord out of range, more than 5 bytes needed")
+      return b128(numpy.maximum(nn, 0), 5)
+
+    cols = numpy.arange(11)
+    for b in range(0, n, blocksize):
+      s = slice(b, b+blocksize)
+      m = numpy.zeros((len(op[s]), 11), dtype=numpy.uint8)
+      m[:,0] = op[s]
+      a = ~rel[s]
+      m[a,1:6]  = abscoord(nx[s][a])
+      m[a,6:11] = abscoord(ny[s][a])
+      h = horiz[s] | other[s]
+      m[h,1:3] = relcoord(rx[s][h])
+      v = vert[s]
+      m[v,1:3] = relcoord(ry[s][v])
+      o = other[s]
+      m[o,3:5] = relcoord(ry[s][o])
+      yield m[cols < length[s][:,None]].tobytes()
 
   def scramble_bytes(self, data):
-    if sys.version_info.major < 3:
-      return bytes([self.scramble(ord(b)) for b in data])
-    else:
-      return bytes([self.scramble(b) for b in data])
+    return ruidacodec.scramble_bytes(data)
 
   def unscramble_bytes(self, data):
-    if sys.version_info.major < 3:
-      return bytes([self.unscramble(ord(b)) for b in data])
-    else:
-      return bytes([self.unscramble(b) for b in data])
+    return ruidacodec.unscramble_bytes(data)
 
   def unscramble(self, b):
     """ unscramble a single byte for reading from *.rd files """
-    res_b=b-1
-    if res_b<0: res_b+=0x100
-    res_b^=0x88
-    fb=res_b&0x80
-    lb=res_b&1
-    res_b=res_b-fb-lb
-    res_b|=lb<<7
-    res_b|=fb>>7
-    return res_b
+    return ruidacodec.unscramble(b)
 
   def scramble(self, b):
     """ scramble a single byte for writing into *.rd files """
-    fb=b&0x80
-    lb=b&1
-    res_b=b-fb-lb
-    res_b|=lb<<7
-    res_b|=fb>>7
-    res_b^=0x88
-    res_b+=1
-    if res_b>0xff:res_b-=0x100
-    return res_b
+    return ruidacodec.scramble(b)
 
   def header(self, layers):
     """
@@ -435,6 +1674,7 @@ class Ruida():
 
     _bbox in [[xmin, ymin], [xmax, ymax]] format, as returned by the boundingbox()
             method. Note: all test data seen had xmin=0, ymin=0.
+            If None, the bounding box of the paths is used, see RuidaLayer.bbox().
     _speed: single value per layer.
     _power: a list of 2 to 8 elements, [min1, max1, ...]
             Missing elements are added by repetition.
@@ -447,11 +1687,12 @@ class Ruida():
 
     bbox = self._globalbbox
     for l in layers:
-      bbox = self.bbox_combine(bbox, l._bbox)
+      bbox = self.bbox_combine(bbox, l.bbox())
     (xmin, ymin) = bbox[0]
     (xmax, ymax) = bbox[1]
 
-    data = self.encode_hex("""
+    data = bytearray()
+    data += self.encode_hex("""
         d8 12           # Red Light on ?
         f0 f1 02 00     # file type ?
         d8 00           # Green Light off ?
@@ -486,13 +1727,14 @@ class Ruida():
       data += self.enc('-bp-bp', ["c6 35", lnum, power[4], "c6 36", lnum, power[5]]) # Laser_3_Min/Max_Pow
       data += self.enc('-bp-bp', ["c6 37", lnum, power[6], "c6 38", lnum, power[7]]) # Laser_3_Min/Max_Pow
 
+      lbbox = l.bbox()
       data += self.enc('-bc-bb-bnn-bnn-bnn-bnn-', ["""
         ca 06""", lnum, l._color, """                     # Layer_CA_06 Layer:0 00 00 00 00 00  RGB-Color for preview
         ca 41""", lnum, 0, """                            # ??
-        e7 52""", lnum, l._bbox[0][0], l._bbox[0][1], """ # E7 52 Layer:0 top left?
-        e7 53""", lnum, l._bbox[1][0], l._bbox[1][1], """ # Bottom_Right_E7_53 Layer:0
-        e7 61""", lnum, l._bbox[0][0], l._bbox[0][1], """ # E7 61 Layer:0 top left?
-        e7 62""", lnum, l._bbox[1][0], l._bbox[1][1], """ # Bottom_Right_E7_62 Layer:0
+        e7 52""", lnum, lbbox[0][0], lbbox[0][1], """     # E7 52 Layer:0 top left?
+        e7 53""", lnum, lbbox[1][0], lbbox[1][1], """     # Bottom_Right_E7_53 Layer:0
+        e7 61""", lnum, lbbox[0][0], lbbox[0][1], """     # E7 61 Layer:0 top left?
+        e7 62""", lnum, lbbox[1][0], lbbox[1][1], """     # Bottom_Right_E7_62 Layer:0
         """])
 
     ## end of per layer headers
@@ -524,7 +1766,7 @@ class Ruida():
         e7 24 00                                        # E7 24 00
         e7 08 00 01 00 01 """, xmax, ymax, """          # Bottom_Right_E7_08 00 01 00 01 17.414mm 24.868mm
         """])
-    return data
+    return bytes(data)
 
 
   def trailer(self, odo=[0.0, 0.0]):
@@ -579,19 +1821,60 @@ class Ruida():
     'r'       encode_relcoord()
     'b'       encode_byte()
     'c'       encode_color()
+
+    The constant parts are parsed only once per format, see enc_template().
     """
     if len(fmt) != len(tupl): raise ValueError("format '"+fmt+"' length differs from len(tupl)="+str(len(tupl)))
 
-    ret = b''
+    key = (fmt,) + tuple([tupl[i] for i in range(len(fmt)) if fmt[i] == '-'])
+    tmpl = self._enc_templates.get(key)
+    if tmpl is None: tmpl = self.enc_template(key)
+    return self.enc_compiled(tmpl, tupl)
+
+  def enc_compiled(self, tmpl, tupl):
+    """
+    Encode the elements of tupl using a template returned by enc_template().
+    Only the variable fields are encoded, constants are copied as is.
+    Use this in loops, to avoid the template lookup of enc().
+    """
+    ret = bytearray()
+    for const, f, i in tmpl:
+      if const is not None:
+        ret += const
+      elif f == 'n': ret += self.encode_number(tupl[i])
+      elif f == 'r': ret += self.encode_relcoord(tupl[i])
+      elif f == 'p': ret += self.encode_percent(tupl[i])
+      elif f == 'b': ret += self.encode_byte(tupl[i])
+      else:          ret += self.encode_color(tupl[i])
+    return bytes(ret)
+
+  def enc_template(self, key):
+    """
+    Compile an enc() format into a template and cache it.
+    key is the format string followed by all hex strings consumed by '-'.
+    Example: key=('-rr', 'a9') is the template for enc('-rr', ['a9', dx, dy])
+
+    The template is a list of (const, fmtchar, index) triples. const is
+    the binary representation of adjacent hex strings (fmtchar and index
+    are None), or None for a variable field, to be encoded from tupl[index].
+    """
+    tmpl = self._enc_templates.get(key)
+    if tmpl is not None: return tmpl
+    fmt = key[0]
+    hexstrings = list(key[1:])
+    tmpl = []
+    const = None
     for i in range(len(fmt)):
-      if   fmt[i] == '-': ret += self.encode_hex(tupl[i])
-      elif fmt[i] == 'n': ret += self.encode_number(tupl[i])
-      elif fmt[i] == 'p': ret += self.encode_percent(tupl[i])
-      elif fmt[i] == 'r': ret += self.encode_relcoord(tupl[i])
-      elif fmt[i] == 'b': ret += self.encode_byte(tupl[i])
-      elif fmt[i] == 'c': ret += self.encode_color(tupl[i])
-      else: raise ValueError("unknown character in fmt: "+fmt)
-    return ret
+      if fmt[i] == '-':
+        const = (const or b'') + self.encode_hex(hexstrings.pop(0))
+        continue
+      if fmt[i] not in 'nprbc': raise ValueError("unknown character in fmt: "+fmt)
+      if const: tmpl.append((const, None, None))
+      const = None
+      tmpl.append((None, fmt[i], i))
+    if const: tmpl.append((const, None, None))
+    self._enc_templates[key] = tmpl
+    return tmpl
 
   def decode_number(self, x):
     "used with a bytes() array of length 5"
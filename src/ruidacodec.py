@@ -0,0 +1,116 @@
+#! /usr/bin/python3
+#
+# ruidacodec.py -- scramble and unscramble the byte stream of *.rd files.
+#
+# The scrambling is a fixed permutation of byte values: swap the most and least
+# significant bit, xor with 0x88, add 1. As each byte is mapped independently,
+# two 256 entry translation tables do all the work. Whole buffers are converted
+# with bytes.translate(), no python code runs per byte.
+#
+# This module is shared by ruida.py, ruidaparser.py, rdcam.py, dummylaser.py and
+# RuidaProxy.py.
+#
+# 2026-10-18, v1.0, agent:    Initial version, replaces the per byte copies in all tools.
+#
+# The code is fully compatible with python 2.7 and 3.5
+#
+import sys
+
+
+def scramble(b):
+  """ scramble a single byte for writing into *.rd files """
+  fb=b&0x80
+  lb=b&1
+  res_b=b-fb-lb
+  res_b|=lb<<7
+  res_b|=fb>>7
+  res_b^=0x88
+  res_b+=1
+  if res_b>0xff:res_b-=0x100
+  return res_b
+
+def unscramble(b):
+  """ unscramble a single byte for reading from *.rd files """
+  res_b=b-1
+  if res_b<0: res_b+=0x100
+  res_b^=0x88
+  fb=res_b&0x80
+  lb=res_b&1
+  res_b=res_b-fb-lb
+  res_b|=lb<<7
+  res_b|=fb>>7
+  return res_b
+
+
+# bytes(bytearray(..)) also gives a proper 256 character table with python2.
+SCRAMBLE_TABLE   = bytes(bytearray([scramble(b)   for b in range(256)]))
+UNSCRAMBLE_TABLE = bytes(bytearray([unscramble(b) for b in range(256)]))
+
+
+def _translatable(data):
+  """ bytes and bytearray can translate(). memoryview, lists of ints, etc. are copied once. """
+  if hasattr(data, 'translate') and not isinstance(data, type(u'')):
+    return data
+  return bytearray(data)
+
+def scramble_bytes(data):
+  """
+  Scramble a complete buffer. Accepts bytes, bytearray, memoryview or a
+  sequence of integers. Returns bytes.
+  """
+  return bytes(_translatable(data).translate(SCRAMBLE_TABLE))
+
+def unscramble_bytes(data):
+  """
+  Unscramble a complete buffer. Accepts bytes, bytearray, memoryview or a
+  sequence of integers. Returns bytes.
+  """
+  return bytes(_translatable(data).translate(UNSCRAMBLE_TABLE))
+
+def scramble_inplace(buf):
+  """
+  Scramble a writable buffer (bytearray or writable memoryview) in place.
+  Returns buf.
+  """
+  buf[:] = _translatable(buf).translate(SCRAMBLE_TABLE)
+  return buf
+
+def unscramble_inplace(buf):
+  """
+  Unscramble a writable buffer (bytearray or writable memoryview) in place.
+  Returns buf.
+  """
+  buf[:] = _translatable(buf).translate(UNSCRAMBLE_TABLE)
+  return buf
+
+def scramble_iter(chunks):
+  """
+  Incremental variant: scramble an iterable of buffers chunk by chunk.
+  Chunk boundaries do not matter, as there is no state between bytes.
+  """
+  for chunk in chunks:
+    yield scramble_bytes(chunk)
+
+def unscramble_iter(chunks):
+  """
+  Incremental variant: unscramble an iterable of buffers chunk by chunk,
+  e.g. UDP packets or blocks read from a file.
+  """
+  for chunk in chunks:
+    yield unscramble_bytes(chunk)
+
+
+if __name__ == '__main__':
+  # self test: the tables must be inverse permutations of each other.
+  for b in range(256):
+    if unscramble(scramble(b)) != b: raise ValueError("scramble(%d) not reversible" % b)
+  data = bytes(bytearray(range(256)))
+  if unscramble_bytes(scramble_bytes(data)) != data: raise ValueError("table roundtrip failed")
+  buf = bytearray(data)
+  unscramble_inplace(memoryview(buf))
+  if scramble_bytes(buf) != data: raise ValueError("memoryview roundtrip failed")
+  if len(sys.argv) > 1:
+    with open(sys.argv[1], 'rb') as fd:
+      sys.stdout.write(" ".join(["%02x" % b for b in bytearray(unscramble_bytes(fd.read()))]) + "\n")
+  else:
+    print("ok")
@@ -0,0 +1,339 @@
+#! /usr/bin/python3
+#
+# ruidaoptimize.py -- reorder paths to minimize travel moves, simplify paths.
+#
+# Travel moves are dead time on the machine. order_paths() finds a short
+# sequence with a greedy nearest neighbour search over a grid spatial index,
+# followed by a bounded 2-opt improvement.
+#
+# Every vertex costs 3 to 11 bytes and controller time. simplify_path() and
+# simplify_array() drop vertices that deviate less than a tolerance from a
+# straight line (Douglas-Peucker).
+#
+# Used by Ruida.optimize() and Ruida.simplify(), works with nested lists and RuidaPathArray.
+#
+# 2026-10-18, v1.0, agent:    Initial version: nearest neighbour and windowed 2-opt.
+# 2026-10-18, v1.1, agent:    rotate closed paths, reverse open paths.
+# 2026-10-18, v1.2, agent:    simplify_path(), simplify_array() added.
+#
+# The code is fully compatible with python 2.7 and 3.5
+#
+import math
+
+try:
+  import numpy          # optional. Only needed for simplify_array().
+except ImportError:
+  numpy = None
+
+
+def dist(p1, p2):
+  dx = p2[0] - p1[0]
+  dy = p2[1] - p1[1]
+  return math.sqrt(dx*dx+dy*dy)
+
+
+class PointGrid():
+  """
+  A uniform grid over a set of entries (x, y, key) for nearest neighbour search.
+  All entries of a key are removed at once with remove(key).
+  """
+  def __init__(self, entries):
+    self._cells = {}
+    self._keys = {}
+    self.count = 0
+    if not entries:
+      self._h = 1.0
+      self._x0 = self._y0 = 0.0
+      self._nx = self._ny = 0
+      return
+    xs = [e[0] for e in entries]
+    ys = [e[1] for e in entries]
+    self._x0 = min(xs)
+    self._y0 = min(ys)
+    w = max(xs) - self._x0
+    h = max(ys) - self._y0
+    # aim at about one entry per cell.
+    self._h = max(w, h, 1e-6) / max(1.0, math.sqrt(len(entries)))
+    self._nx = int(w / self._h) + 1
+    self._ny = int(h / self._h) + 1
+    for e in entries:
+      c = self._cell(e[0], e[1])
+      self._cells.setdefault(c, []).append(e)
+      if e[2] not in self._keys:
+        self._keys[e[2]] = set()
+        self.count += 1
+      self._keys[e[2]].add(c)
+
+  def _cell(self, x, y):
+    return (int(math.floor((x - self._x0) / self._h)), int(math.floor((y - self._y0) / self._h)))
+
+  def remove(self, key):
+    for c in self._keys.pop(key):
+      cell = self._cells[c]
+      cell[:] = [e for e in cell if e[2] != key]
+      if not cell: del self._cells[c]
+    self.count -= 1
+
+  def entries(self):
+    return [e for cell in self._cells.values() for e in cell]
+
+  def nearest(self, xy):
+    """
+    Returns the entry (x, y, key) closest to xy, or None if the grid is empty.
+    The search expands ring by ring around the cell of xy, and stops when
+    no unseen cell can hold a closer entry.
+    """
+    if not self._cells: return None
+    cx, cy = self._cell(xy[0], xy[1])
+    rmax = max(cx, self._nx-1-cx, cy, self._ny-1-cy)
+    best = None
+    best_d = None
+    r = 0
+    while r <= rmax:
+      for ix in range(max(cx-r, 0), min(cx+r, self._nx-1)+1):
+        if abs(ix-cx) == r: iys = range(max(cy-r, 0), min(cy+r, self._ny-1)+1)
+        else:               iys = [iy for iy in (cy-r, cy+r) if 0 <= iy < self._ny]
+        for iy in iys:
+          for e in self._cells.get((ix, iy), ()):
+            d = dist(xy, e)
+            if best_d is None or d < best_d:
+              best = e
+              best_d = d
+      if best is not None and best_d <= r * self._h: break
+      r += 1
+    return best
+
+
+def is_closed(path):
+  """ A closed path (loop) ends where it starts. """
+  return len(path) > 2 and path[0][0] == path[-1][0] and path[0][1] == path[-1][1]
+
+
+def order_paths(paths, start=(0,0), window=25, passes=2, rotate=False, reverse=False):
+  """
+  Find a sequence of paths with short travel moves between them.
+  paths is a list of paths, or a RuidaPathArray.
+
+  A greedy nearest neighbour tour over the entry points, using a grid
+  spatial index, is improved by 2-opt: a run of up to window paths is
+  visited in reverse order, whenever that shortens the travel. passes
+  limits the number of 2-opt sweeps.
+
+  With rotate=True, closed paths can be entered at any vertex, the one closest
+  to the current head position is used.
+  With reverse=True, open paths can also be entered at their last vertex, and
+  are then cut backwards. 2-opt then also reverses the paths of a run.
+
+  Returns a plan, a list of (index, start_vertex, reversed) tuples, see
+  apply_plan(). Empty paths are appended at the end.
+  """
+  idx = [i for i in range(len(paths)) if len(paths[i])]
+  empty = [i for i in range(len(paths)) if not len(paths[i])]
+  S = [(float(paths[i][0][0]),  float(paths[i][0][1]))  for i in idx]
+  E = [(float(paths[i][-1][0]), float(paths[i][-1][1])) for i in idx]
+  closed = [rotate and is_closed(paths[i]) for i in idx]
+
+  # grid entries (x, y, k, start_vertex, reversed)
+  entries = []
+  for k in range(len(idx)):
+    if closed[k]:
+      path = paths[idx[k]]
+      for v in range(len(path)-1):
+        entries.append((float(path[v][0]), float(path[v][1]), k, v, False))
+    else:
+      entries.append((S[k][0], S[k][1], k, 0, False))
+      if reverse: entries.append((E[k][0], E[k][1], k, 0, True))
+
+  grid = PointGrid(entries)
+  total = grid.count
+  order = []
+  plan = {}
+  cur = start
+  while grid.count:
+    e = grid.nearest(cur)
+    k = e[2]
+    grid.remove(k)
+    order.append(k)
+    plan[k] = [e[3], e[4]]
+    if closed[k]:
+      S[k] = E[k] = (e[0], e[1])
+    elif e[4]:
+      S[k], E[k] = E[k], S[k]
+    cur = E[k]
+    # rebuild, when most cells ran empty. Keeps the ring search short.
+    if grid.count > 64 and grid.count * 4 < total:
+      grid = PointGrid(grid.entries())
+      total = grid.count
+
+  flipped = [False] * len(idx)
+  two_opt(order, S, E, start, window, passes, flipped=(flipped if reverse else None))
+  return [(idx[k], plan[k][0], plan[k][1] != flipped[k]) for k in order] + [(i, 0, False) for i in empty]
+
+
+def apply_plan(paths, plan):
+  """
+  Returns a new list of paths, ordered as in plan (see order_paths()).
+  A start_vertex > 0 rotates a closed path to begin (and end) there.
+  Reversed paths are returned backwards.
+  """
+  res = []
+  for i, v, rev in plan:
+    path = paths[i]
+    if v: path = path[v:-1] + path[:v+1]
+    if rev: path = path[::-1]
+    res.append(path)
+  return res
+
+
+def two_opt(order, S, E, start=(0,0), window=25, passes=2, flipped=None):
+  """
+  Improve order in place. S[k] and E[k] are the start and end points of item k.
+  Reversing the run order[i+1:j+1] changes only the travel moves into, within
+  and out of the run. Runs are limited to window items.
+
+  If a list flipped is given, the items of a reversed run are also traversed
+  backwards: S[k] and E[k] are swapped and flipped[k] is toggled. The travel
+  inside the run then stays the same, this is the classic 2-opt move.
+  Items with S[k] == E[k] are never flipped.
+
+  Returns the number of improvements made.
+  """
+  n = len(order)
+  hypot = math.hypot
+  count = 0
+  for p in range(passes):
+    improved = 0
+    for i in range(-1, n-2):
+      ax, ay = start if i < 0 else E[order[i]]
+      first = order[i+1]
+      fx, fy = E[first]
+      sx, sy = S[first]
+      sx_first, sy_first = sx, sy
+      head = hypot(sx-ax, sy-ay)
+      fwd = rev = 0.0
+      pex, pey = fx, fy         # end and start of order[j-1]
+      psx, psy = sx, sy
+      for j in range(i+2, min(n, i+2+window)):
+        sx, sy = S[order[j]]
+        ex, ey = E[order[j]]
+        fwd += hypot(sx-pex, sy-pey)
+        rev += hypot(psx-ex, psy-ey)
+        old = head + fwd
+        if flipped is None: new = hypot(sx-ax, sy-ay) + rev
+        else:               new = hypot(ex-ax, ey-ay) + fwd
+        if j+1 < n:
+          bx, by = S[order[j+1]]
+          old += hypot(bx-ex, by-ey)
+          if flipped is None: new += hypot(bx-fx, by-fy)
+          else:               new += hypot(bx-sx_first, by-sy_first)
+        if new < old - 1e-9:
+          order[i+1:j+1] = order[i+1:j+1][::-1]
+          if flipped is not None:
+            for k in order[i+1:j+1]:
+              if S[k] == E[k]: continue     # closed paths keep their direction.
+              S[k], E[k] = E[k], S[k]
+              flipped[k] = not flipped[k]
+          improved += 1
+          break
+        pex, pey = ex, ey
+        psx, psy = sx, sy
+    count += improved
+    if not improved: break
+  return count
+
+
+def segment_dist(p, a, b):
+  """ distance of point p from the line segment a-b """
+  vx = b[0] - a[0]
+  vy = b[1] - a[1]
+  px = p[0] - a[0]
+  py = p[1] - a[1]
+  l2 = vx*vx + vy*vy
+  t = 0.0
+  if l2 > 0: t = min(1.0, max(0.0, (px*vx + py*vy) / l2))
+  dx = px - t*vx
+  dy = py - t*vy
+  return math.sqrt(dx*dx+dy*dy)
+
+
+def simplify_path(path, tolerance):
+  """
+  Douglas-Peucker: returns a new path without the vertices that are closer than
+  tolerance to the simplified line. The first and last vertex are always kept,
+  so closed paths stay closed.
+  """
+  n = len(path)
+  if n < 3: return list(path)
+  keep = [False] * n
+  keep[0] = keep[-1] = True
+  stack = [(0, n-1)]
+  while stack:
+    a, b = stack.pop()
+    dmax = -1.0
+    m = None
+    for i in range(a+1, b):
+      d = segment_dist(path[i], path[a], path[b])
+      if d > dmax:
+        dmax = d
+        m = i
+    if m is not None and dmax > tolerance:
+      keep[m] = True
+      stack.append((a, m))
+      stack.append((m, b))
+  return [path[i] for i in range(n) if keep[i]]
+
+
+def simplify_array(xy, offsets, tolerance):
+  """
+  Vectorized Douglas-Peucker for all paths at once. xy is a numpy array of
+  shape (N, 2), offsets the start index of each path and N at the end, as in
+  RuidaPathArray. Each round splits all open segments of all paths at their
+  farthest vertex, so the number of rounds is the recursion depth.
+
+  Returns a boolean numpy array: True for the vertices to keep.
+  Same result as simplify_path() for each path. xy may also hold integers,
+  e.g. the micrometers of a RuidaPathStore.
+  """
+  n = len(xy)
+  keep = numpy.zeros(n, dtype=bool)
+  starts = offsets[:-1]
+  ends = offsets[1:] - 1
+  nonempty = ends >= starts
+  keep[starts[nonempty]] = True
+  keep[ends[nonempty]] = True
+  seg = ends - starts >= 2
+  a = starts[seg]
+  b = ends[seg]
+  x = xy[:,0]
+  y = xy[:,1]
+  f = lambda v: numpy.asarray(v, dtype=numpy.float64)     # integer coordinates are computed in float, too.
+  while len(a):
+    cnt = b - a - 1
+    first = numpy.concatenate([[0], numpy.cumsum(cnt)[:-1]])
+    segid = numpy.repeat(numpy.arange(len(a)), cnt)
+    i = numpy.arange(int(cnt.sum())) - first[segid] + a[segid] + 1
+    ax = f(x[a][segid])
+    ay = f(y[a][segid])
+    vx = f(x[b][segid]) - ax
+    vy = f(y[b][segid]) - ay
+    px = f(x[i]) - ax
+    py = f(y[i]) - ay
+    l2 = vx*vx + vy*vy
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+      t = numpy.where(l2 > 0, numpy.clip((px*vx + py*vy) / l2, 0.0, 1.0), 0.0)
+    dx = px - t*vx
+    dy = py - t*vy
+    d = numpy.sqrt(dx*dx+dy*dy)
+    dmax = numpy.maximum.reduceat(d, first)
+    # the first vertex with the maximum distance in each segment.
+    hit = numpy.flatnonzero(d == dmax[segid])
+    seghit, pos = numpy.unique(segid[hit], return_index=True)
+    m = numpy.zeros(len(a), dtype=numpy.int64)
+    m[seghit] = i[hit[pos]]
+    split = dmax > tolerance
+    keep[m[split]] = True
+    a, m, b = a[split], m[split], b[split]
+    a, b = numpy.concatenate([a, m]), numpy.concatenate([m, b])
+    seg = b - a >= 2
+    a, b = a[seg], b[seg]
+  return keep
@@ -10,47 +10,80 @@
 # 2024-04-01, v1.2, jw:       Prefixed all token metods with t_
 #                             Allow decode params in skip_msg()
 #                             Added Direct_Move_Z_rel & friends.
+# 2026-10-18, v1.3, agent:    unscramble via the shared tables in ruidacodec.py
+# 2026-10-18, v1.4, agent:    decode() walks a cursor over a memoryview. No copies, linear time.
+# 2026-10-18, v1.5, agent:    Flat dispatch table, messages only formatted for debug output.
+#                             decode(geometry=True) fast mode for paths only.
+# 2026-10-18, v1.6, agent:    feed() decodes a stream of chunks incrementally.
+# 2026-10-18, v1.7, agent:    RuidaParser(file=.., lazy=True) maps the file, unscrambles it window by window.
+#                             decode_header() stops before the first move.
+# 2026-10-18, v1.8, agent:    decode(columns=True) collects the paths in flat arrays, columns() returns them as numpy arrays.
+# 2026-10-18, v1.9, agent:    write_svg() streams the svg, formats each path in one go, optional preview decimation.
 #
 # TODO: implement all codes seen in https://edutechwiki.unige.ch/en/Ruida
 #
-import sys
+import sys, re, io, math, mmap, array, itertools
+import ruidacodec
+
+try:
+  import numpy          # only needed for columns()
+except ImportError:
+  numpy = None
 
 class RuidaParser():
   """
   """
-  def __init__(self, buf=None, file=None):
+  def __init__(self, buf=None, file=None, lazy=False):
     # input
     self._buf  = buf
     self._file  = file
+    self._pos  = 0        # cursor into _buf, see decode()
+    self._debug = False   # token methods only format messages for decode(debug=True)
+    self._tail = b''      # incomplete command, kept by feed() and decode_mapped()
+    self._fed  = 0        # stream offset of _buf, for feed() and decode_mapped()
+    self._map  = None     # the memory mapped file, with lazy=True
+    self._mapoff = 0      # offset of the next window in _map, see decode_mapped()
     # output
     self._bbox = [ 10e9, 10e9, -10e9, -10e9 ]
     self._paths = []
     self._layer = {}
     self._laser = {}
+    self._xy = None         # with decode(columns=True): all vertices as x, y, x, y, ...
+    self._offsets = None    # index of the first vertex of each path
+    self._path_layer = None # layer of each path
     # intializations
     if file and not buf:
       fd = open(file, 'rb')
-      self._buf = self.unscramble_bytes(fd.read())
+      if lazy:
+        # nothing is read here. decode() unscrambles one window at a time.
+        try:
+          self._map = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+          self._buf = b''       # empty files cannot be mapped
+      else:
+        self._buf = self.unscramble_bytes(fd.read())
       fd.close()
 
+  def close(self):
+    """ release the memory mapped file of lazy=True """
+    if self._map is not None: self._map.close()
+    self._map = None
+
+  def __enter__(self):
+    """ with RuidaParser(file=..., lazy=True) as r: ... closes the mapped file at the end. """
+    return self
+
+  def __exit__(self, *exc):
+    self.close()
+    return False
+
 
   def unscramble_bytes(self, data):
-    if sys.version_info.major < 3:
-      return bytes([self.unscramble(ord(b)) for b in data])
-    else:
-      return bytes([self.unscramble(b) for b in data])
+    return ruidacodec.unscramble_bytes(data)
 
   def unscramble(self, b):
     """ unscramble a single byte for reading from *.rd files """
-    res_b=b-1
-    if res_b<0: res_b+=0x100
-    res_b^=0x88
-    fb=res_b&0x80
-    lb=res_b&1
-    res_b=res_b-fb-lb
-    res_b|=lb<<7
-    res_b|=fb>>7
-    return res_b
+    return ruidacodec.unscramble(b)
 
 
   def get_layer(self, n):
@@ -102,7 +135,7 @@ class RuidaParser():
     """
     r = (x[0] << 7) + x[1]
     if r > 16383 or r < 0:
-      raise ValueError("Not a rel coord: " + repr(x[0:2]))
+      raise ValueError("Not a rel coord: " + repr(bytes(x[0:2])))
     if r > 8191: return 0.001 * (r-16384)
     else:        return 0.001 * r
 
@@ -112,33 +145,34 @@ class RuidaParser():
     """
     return ( (x[0]<<7) + x[1] ) * 100/0x3fff
 
-  def arg_strz(self, off=0):
-    string=""
-    while self._buf[off] != 0x00:
-      string += "%c" % self._buf[off]
-      off += 1
-    return off+1, string
+  # The arg_*() methods decode one argument at the absolute offset off into
+  # self._buf, and return the offset behind it, together with the value.
 
-  def arg_byte(self, off=0):
+  def arg_strz(self, off):
+    end = off
+    while self._buf[end] != 0x00: end += 1
+    return end+1, "".join(["%c" % c for c in self._buf[off:end]])
+
+  def arg_byte(self, off):
     return off+1, self._buf[off]
 
-  def arg_perc(self, off=0):
+  def arg_perc(self, off):
     buf = self._buf[off:off+2]
     return off+2, int( self.decode_percent_float(buf) + .5 )
 
-  def arg_perc_f(self, off=0):
+  def arg_perc_f(self, off):
     buf = self._buf[off:off+2]
     return off+2, self.decode_percent_float(buf)
 
-  def arg_abs(self, off=0):
+  def arg_abs(self, off):
     buf = self._buf[off:off+5]
     return off+5, self.decode_number(buf)
 
-  def arg_rel(self, off=0):
+  def arg_rel(self, off):
     buf = self._buf[off:off+2]
     return off+2, self.decode_relcoord(buf)
 
-  def arg_color(self, off=0):
+  def arg_color(self, off):
     buf = self._buf[off:off+5]
     # color, BGR, each value 8 bits, distributed over four 7-bit values
     rgb = list(reversed(list(buf)))
@@ -160,13 +194,17 @@ class RuidaParser():
                   to fill an array printed in '[...]' with decoded values.
                 - if given, the sum of the skips and arg_*() consumptions
                   is returned as the total buffer consumption. (n otherwise)
+        The arguments start at the cursor self._pos. Without self._debug,
+        only the consumption is computed, the message is None.
     """
-    buf = self._buf
+    pos = self._pos
+    avail = len(self._buf) - pos
     r = []
-    if len(buf) < n:
-      return "ERROR: len(buf)=%d < n=%d" % (len(buf), n)
-    for i in range(n):
-      r.append("%02x" % buf[i])
+    if avail < n:
+      return "ERROR: len(buf)=%d < n=%d" % (avail, n)
+    if self._debug:
+      for b in self._buf[pos:pos+n]:
+        r.append("%02x" % b)
     if type(desc) == type([]):
       # r.append('('+desc[0]+')') # already done (later) by our caller token_method
       off = 0
@@ -177,7 +215,8 @@ class RuidaParser():
         else:
           val = None
           try:
-            n, val = arg(self, off)
+            n, val = arg(self, pos + off)
+            n -= pos
           except Exception as e:
             import traceback
             print(str(desc))    # in case we need to debug, what it is..
@@ -185,9 +224,10 @@ class RuidaParser():
           # v.append(str(buf[off:n])+str(val))
           v.append(val)
           off = n
-      if len(v): r.append("=>"+str(v))
+      if len(v) and self._debug: r.append("=>"+str(v))
       if len(desc) > 1:
         n = off
+    if not self._debug: return n, None
     return n, " ".join(r)
 
   def t_skip_bytes(self, n, desc=None):
@@ -197,113 +237,129 @@ class RuidaParser():
     return self.skip_msg(n, desc)
 
   def t_layer_priority(self, n, desc=None):
-    l = self._buf[0]
+    p = self._pos
+    l = self._buf[p]
     self._prio = l
-    return 1, "t_layer_priority(%d)" % l
+    return 1, ("t_layer_priority(%d)" % l if self._debug else None)
 
   def t_laser_offset(self, n, desc=None):
+    p = self._pos
     las = self.get_laser(desc[1])
-    off, x = self.arg_abs()
+    off, x = self.arg_abs(p)
     off, y = self.arg_abs(off)
     las['offset'][0] = x
     las['offset'][1] = y
-    return off, "t_laser_offset(%d, %.8gmm, %.8gmm)" % (las['n'], x, y)
+    return off-p, ("t_laser_offset(%d, %.8gmm, %.8gmm)" % (las['n'], x, y) if self._debug else None)
 
   def t_bb_top_left(self, n, desc=None):
-    off, x = self.arg_abs()
+    p = self._pos
+    off, x = self.arg_abs(p)
     off, y = self.arg_abs(off)
     if x < self._bbox[0]: self._bbox[0] = x
     if y < self._bbox[1]: self._bbox[1] = y
-    return off, "t_bb_top_left(%.8gmm, %.8gmm)" % (x, y)
+    return off-p, ("t_bb_top_left(%.8gmm, %.8gmm)" % (x, y) if self._debug else None)
 
   def t_lay_top_left(self, n, desc=None):
-    l = self.get_layer(self._buf[0])
-    off, x = self.arg_abs(1)
+    p = self._pos
+    l = self.get_layer(self._buf[p])
+    off, x = self.arg_abs(p+1)
     off, y = self.arg_abs(off)
     if x < self._bbox[0]: self._bbox[0] = x
     if y < self._bbox[1]: self._bbox[1] = y
     l['bbox'][0] = x
     l['bbox'][1] = y
-    return off, "t_lay_top_left(%d, %.8gmm, %.8gmm)" % (l['n'], x, y)
+    return off-p, ("t_lay_top_left(%d, %.8gmm, %.8gmm)" % (l['n'], x, y) if self._debug else None)
 
   def t_bb_bot_right(self, n, desc=None):
-    off, x = self.arg_abs()
+    p = self._pos
+    off, x = self.arg_abs(p)
     off, y = self.arg_abs(off)
     if x > self._bbox[2]: self._bbox[2] = x
     if y > self._bbox[3]: self._bbox[3] = y
-    return off, "t_bb_bot_right(%.8gmm, %.8gmm)" % (x, y)
+    return off-p, ("t_bb_bot_right(%.8gmm, %.8gmm)" % (x, y) if self._debug else None)
 
   def t_lay_bot_right(self, n, desc=None):
-    l = self.get_layer(self._buf[0])
-    off, x = self.arg_abs(1)
+    p = self._pos
+    l = self.get_layer(self._buf[p])
+    off, x = self.arg_abs(p+1)
     off, y = self.arg_abs(off)
     if x > self._bbox[2]: self._bbox[2] = x
     if y > self._bbox[3]: self._bbox[3] = y
     l['bbox'][2] = x
     l['bbox'][3] = y
-    return off, "t_lay_bot_right(%d, %.8gmm, %.8gmm)" % (l['n'], x, y)
+    return off-p, ("t_lay_bot_right(%d, %.8gmm, %.8gmm)" % (l['n'], x, y) if self._debug else None)
 
   def t_feeding(self, n, desc=None):
-    off, x = self.arg_abs()
+    p = self._pos
+    off, x = self.arg_abs(p)
     off, y = self.arg_abs(off)
-    return off, "t_feeding(%.8gmm, %.8gmm)" % (x, y)
+    return off-p, ("t_feeding(%.8gmm, %.8gmm)" % (x, y) if self._debug else None)
 
   def t_layer_speed(self, n, desc=None):
-    l = self.get_layer(self._buf[0])
-    off, x = self.arg_abs(1)
+    p = self._pos
+    l = self.get_layer(self._buf[p])
+    off, x = self.arg_abs(p+1)
     l['speed'] = x
-    return off, "t_layer_speed(%d, %.8gmm)" % (l['n'], x)
+    return off-p, ("t_layer_speed(%d, %.8gmm)" % (l['n'], x) if self._debug else None)
 
   def t_layer_color(self, n, desc=None):
-    l = self.get_layer(self._buf[0])
-    off, rgb = self.arg_color(1)
+    p = self._pos
+    l = self.get_layer(self._buf[p])
+    off, rgb = self.arg_color(p+1)
     l['color'] = "#%06x" % rgb
-    return off, "t_layer_color(%d, 0x%06x)" % (l['n'], rgb)
+    return off-p, ("t_layer_color(%d, 0x%06x)" % (l['n'], rgb) if self._debug else None)
 
   def t_laser_freq(self, n, desc=None):
-    las = self.get_laser(self._buf[0])
-    off, x = self.arg_abs(2)
+    p = self._pos
+    las = self.get_laser(self._buf[p])
+    off, x = self.arg_abs(p+2)
     las['freq'] = x
-    return off, "t_laser_freq(%d, %.8g)" % (las['n'], x)
+    return off-p, ("t_laser_freq(%d, %.8g)" % (las['n'], x) if self._debug else None)
 
   def t_laser_min_pow(self, n, desc=None):
+    p = self._pos
     las = self.get_laser(desc[1])
-    off, x = self.arg_perc()
+    off, x = self.arg_perc(p)
     las['min_pow'] = x
-    return off, "t_laser_min_pow(%d, %d%%)" % (las['n'], x)
+    return off-p, ("t_laser_min_pow(%d, %d%%)" % (las['n'], x) if self._debug else None)
 
   def t_laser_max_pow(self, n, desc=None):
+    p = self._pos
     las = self.get_laser(desc[1])
-    off, x = self.arg_perc()
+    off, x = self.arg_perc(p)
     las['max_pow'] = x
-    return off, "t_laser_max_pow(%d, %d%%)" % (las['n'], x)
+    return off-p, ("t_laser_max_pow(%d, %d%%)" % (las['n'], x) if self._debug else None)
 
   def t_laser_min_pow_lay(self, n, desc=None):
-    l = self._buf[0]
+    p = self._pos
+    l = self._buf[p]
     las = self.get_laser(desc[1], l)
-    off, x = self.arg_perc(1)
+    off, x = self.arg_perc(p+1)
     las['min_pow'] = x
-    return off, "t_laser_min_pow_lay(%d, %d, %d%%)" % (las['n'], l, x)
+    return off-p, ("t_laser_min_pow_lay(%d, %d, %d%%)" % (las['n'], l, x) if self._debug else None)
 
   def t_laser_max_pow_lay(self, n, desc=None):
-    l = self._buf[0]
+    p = self._pos
+    l = self._buf[p]
     las = self.get_laser(desc[1], l)
-    off, x = self.arg_perc(1)
+    off, x = self.arg_perc(p+1)
     las['max_pow'] = x
-    return off, "t_laser_max_pow_lay(%d, %d, %d%%)" % (las['n'], l, x)
+    return off-p, ("t_laser_max_pow_lay(%d, %d, %d%%)" % (las['n'], l, x) if self._debug else None)
 
   def t_cut_through_pow(self, n, desc=None):
     n, msg = self.skip_msg(n, desc)
-    return n, "t_cut_through_pow: " + msg
+    return n, ("t_cut_through_pow: " + msg if self._debug else None)
 
   def t_move_abs(self, n, desc=None):
-    off, x = self.arg_abs()
+    p = self._pos
+    off, x = self.arg_abs(p)
     off, y = self.arg_abs(off)
     self.new_path().append([x,y])
-    return off, "t_move_abs(%.8gmm, %.8gmm)" % (x, y)
+    return off-p, ("t_move_abs(%.8gmm, %.8gmm)" % (x, y) if self._debug else None)
 
   def t_move_rel(self, n, desc=None):
-    off, dx = self.arg_rel()
+    p = self._pos
+    off, dx = self.arg_rel(p)
     off, dy = self.arg_rel(off)
     try:
       xy = self.relative_xy(dx, dy)      # must call relative_xy() before new_path()
@@ -311,41 +367,217 @@ class RuidaParser():
     except:
       # ignore Z moves...
       pass
-    return off, "t_move_rel(%.8gmm, %.8gmm)" % (dx, dy)
+    return off-p, ("t_move_rel(%.8gmm, %.8gmm)" % (dx, dy) if self._debug else None)
 
   def t_cut_abs(self, n, desc=None):
-    off, x = self.arg_abs()
+    p = self._pos
+    off, x = self.arg_abs(p)
     off, y = self.arg_abs(off)
     self.get_path().append([x,y])
-    return off, "t_cut_abs(%.8gmm, %.8gmm)" % (x, y)
+    return off-p, ("t_cut_abs(%.8gmm, %.8gmm)" % (x, y) if self._debug else None)
 
   def t_cut_rel(self, n, desc=None):
-    off, dx = self.arg_rel()
+    p = self._pos
+    off, dx = self.arg_rel(p)
     off, dy = self.arg_rel(off)
     self.get_path().append(self.relative_xy(dx, dy))
-    return off, "t_cut_rel(%.8gmm, %.8gmm)" % (dx, dy)
+    return off-p, ("t_cut_rel(%.8gmm, %.8gmm)" % (dx, dy) if self._debug else None)
 
   def t_cut_horiz(self, n, desc=None):
-    off, dx = self.arg_rel()
+    p = self._pos
+    off, dx = self.arg_rel(p)
     self.get_path().append(self.relative_xy(dx, 0))
-    return n, "t_cut_horiz(%.8gmm)" % dx
+    return n, ("t_cut_horiz(%.8gmm)" % dx if self._debug else None)
 
   def t_cut_vert(self, n, desc=None):
-    off, dy = self.arg_rel()
+    p = self._pos
+    off, dy = self.arg_rel(p)
     self.get_path().append(self.relative_xy(0, dy))
-    return n, "t_cut_vert(%.8gmm)" % dy
+    return n, ("t_cut_vert(%.8gmm)" % dy if self._debug else None)
 
   def t_move_horiz(self, n, desc=None):
-    off, dx = self.arg_rel()
+    p = self._pos
+    off, dx = self.arg_rel(p)
     xy = self.relative_xy(dx, 0)
     self.new_path().append(xy)
-    return off, "t_move_horiz(%.8gmm)" % dx
+    return off-p, ("t_move_horiz(%.8gmm)" % dx if self._debug else None)
 
   def t_move_vert(self, n, desc=None):
-    off, dy = self.arg_rel()
+    p = self._pos
+    off, dy = self.arg_rel(p)
     xy = self.relative_xy(0, dy)
     self.new_path().append(xy)
-    return off, "t_move_vert(%.8gmm)" % dy
+    return off-p, ("t_move_vert(%.8gmm)" % dy if self._debug else None)
+
+  # Token methods for decode(geometry=True), see compile_entry(). Same results
+  # as their t_*() counterparts, but the arguments are decoded inline, and no
+  # messages are returned. Invalid or truncated arguments are left to t_*().
+
+  rel_mm = [0.001 * (r-16384) if r > 8191 else 0.001 * r for r in range(16384)]
+
+  def g_abs(self, p):
+    b = self._buf
+    res = (((b[p]*0x80 + b[p+1])*0x80 + b[p+2])*0x80 + b[p+3])*0x80 + b[p+4]
+    if res > 0x80000000: res = res - 0x100000000
+    return res * 0.001
+
+  def g_current(self):
+    if not self._paths: self.new_path().append([0,0])
+    return self._paths[-1]['data'][-1]
+
+  def g_move_abs(self, n, desc=None):
+    p = self._pos
+    if p + 10 > len(self._buf): return self.t_move_abs(n, desc)
+    self.new_path().append([self.g_abs(p), self.g_abs(p+5)])
+    return 10, None
+
+  def g_cut_abs(self, n, desc=None):
+    p = self._pos
+    if p + 10 > len(self._buf): return self.t_cut_abs(n, desc)
+    self.get_path().append([self.g_abs(p), self.g_abs(p+5)])
+    return 10, None
+
+  def g_move_rel(self, n, desc=None):
+    b = self._buf
+    p = self._pos
+    rx = (b[p] << 7) + b[p+1]
+    ry = (b[p+2] << 7) + b[p+3]
+    if rx > 16383 or ry > 16383: return self.t_move_rel(n, desc)
+    c = self.g_current()
+    self.new_path().append([c[0] + self.rel_mm[rx], c[1] + self.rel_mm[ry]])
+    return 4, None
+
+  def g_cut_rel(self, n, desc=None):
+    b = self._buf
+    p = self._pos
+    rx = (b[p] << 7) + b[p+1]
+    ry = (b[p+2] << 7) + b[p+3]
+    if rx > 16383 or ry > 16383: return self.t_cut_rel(n, desc)
+    path = self.get_path()
+    c = path[-1]
+    path.append([c[0] + self.rel_mm[rx], c[1] + self.rel_mm[ry]])
+    return 4, None
+
+  def g_move_horiz(self, n, desc=None):
+    r = (self._buf[self._pos] << 7) + self._buf[self._pos+1]
+    if r > 16383: return self.t_move_horiz(n, desc)
+    c = self.g_current()
+    self.new_path().append([c[0] + self.rel_mm[r], c[1]])
+    return 2, None
+
+  def g_move_vert(self, n, desc=None):
+    r = (self._buf[self._pos] << 7) + self._buf[self._pos+1]
+    if r > 16383: return self.t_move_vert(n, desc)
+    c = self.g_current()
+    self.new_path().append([c[0], c[1] + self.rel_mm[r]])
+    return 2, None
+
+  def g_cut_horiz(self, n, desc=None):
+    r = (self._buf[self._pos] << 7) + self._buf[self._pos+1]
+    if r > 16383: return self.t_cut_horiz(n, desc)
+    path = self.get_path()
+    c = path[-1]
+    path.append([c[0] + self.rel_mm[r], c[1]])
+    return 2, None
+
+  def g_cut_vert(self, n, desc=None):
+    r = (self._buf[self._pos] << 7) + self._buf[self._pos+1]
+    if r > 16383: return self.t_cut_vert(n, desc)
+    path = self.get_path()
+    c = path[-1]
+    path.append([c[0], c[1] + self.rel_mm[r]])
+    return 2, None
+
+  geometry_method = { t_move_abs: g_move_abs, t_move_rel: g_move_rel, t_move_horiz: g_move_horiz, t_move_vert: g_move_vert,
+                      t_cut_abs: g_cut_abs, t_cut_rel: g_cut_rel, t_cut_horiz: g_cut_horiz, t_cut_vert: g_cut_vert }
+
+  # Token methods for decode(columns=True). As g_*(), but the vertices are
+  # appended to flat arrays instead of a list per path, see columns().
+  # Invalid relative coordinates raise in t_*() as usual.
+
+  def c_path(self):
+    self._offsets.append(len(self._xy) >> 1)
+    self._path_layer.append(self._prio)
+
+  def c_current(self):
+    xy = self._xy
+    if not xy:
+      self.c_path()
+      xy.extend((0.0, 0.0))     # Moveto missing? Assume we start at origin.
+    return xy[-2], xy[-1]
+
+  def c_abs(self, p):
+    if p + 10 > len(self._buf):
+      off, x = self.arg_abs(p)
+      off, y = self.arg_abs(off)
+      return x, y
+    return self.g_abs(p), self.g_abs(p+5)
+
+  def c_move_abs(self, n, desc=None):
+    x, y = self.c_abs(self._pos)
+    self.c_path()
+    self._xy.extend((x, y))
+    return 10, None
+
+  def c_cut_abs(self, n, desc=None):
+    x, y = self.c_abs(self._pos)
+    if not self._xy: self.c_current()
+    self._xy.extend((x, y))
+    return 10, None
+
+  def c_move_rel(self, n, desc=None):
+    b = self._buf
+    p = self._pos
+    rx = (b[p] << 7) + b[p+1]
+    ry = (b[p+2] << 7) + b[p+3]
+    if rx > 16383 or ry > 16383: return self.t_move_rel(n, desc)
+    x, y = self.c_current()
+    self.c_path()
+    self._xy.extend((x + self.rel_mm[rx], y + self.rel_mm[ry]))
+    return 4, None
+
+  def c_cut_rel(self, n, desc=None):
+    b = self._buf
+    p = self._pos
+    rx = (b[p] << 7) + b[p+1]
+    ry = (b[p+2] << 7) + b[p+3]
+    if rx > 16383 or ry > 16383: return self.t_cut_rel(n, desc)
+    x, y = self.c_current()
+    self._xy.extend((x + self.rel_mm[rx], y + self.rel_mm[ry]))
+    return 4, None
+
+  def c_move_horiz(self, n, desc=None):
+    r = (self._buf[self._pos] << 7) + self._buf[self._pos+1]
+    if r > 16383: return self.t_move_horiz(n, desc)
+    x, y = self.c_current()
+    self.c_path()
+    self._xy.extend((x + self.rel_mm[r], y))
+    return 2, None
+
+  def c_move_vert(self, n, desc=None):
+    r = (self._buf[self._pos] << 7) + self._buf[self._pos+1]
+    if r > 16383: return self.t_move_vert(n, desc)
+    x, y = self.c_current()
+    self.c_path()
+    self._xy.extend((x, y + self.rel_mm[r]))
+    return 2, None
+
+  def c_cut_horiz(self, n, desc=None):
+    r = (self._buf[self._pos] << 7) + self._buf[self._pos+1]
+    if r > 16383: return self.t_cut_horiz(n, desc)
+    x, y = self.c_current()
+    self._xy.extend((x + self.rel_mm[r], y))
+    return 2, None
+
+  def c_cut_vert(self, n, desc=None):
+    r = (self._buf[self._pos] << 7) + self._buf[self._pos+1]
+    if r > 16383: return self.t_cut_vert(n, desc)
+    x, y = self.c_current()
+    self._xy.extend((x, y + self.rel_mm[r]))
+    return 2, None
+
+  columns_method = { t_move_abs: c_move_abs, t_move_rel: c_move_rel, t_move_horiz: c_move_horiz, t_move_vert: c_move_vert,
+                     t_cut_abs: c_cut_abs, t_cut_rel: c_cut_rel, t_cut_horiz: c_cut_horiz, t_cut_vert: c_cut_vert }
 
 
   rd_decoder_table = {
@@ -511,6 +743,8 @@ class RuidaParser():
         msg, an infomational message to print.
       token methods may also look into self.buf to actually examine the buffer contents.
       (the buffer position is automatically advanced by n by the caller.)
+
+      decode() does not come here, it calls the methods as prepared by compile_entry().
     """
     consumed,msg = 0,None
     if len(c) == 2:
@@ -526,60 +760,303 @@ class RuidaParser():
     return consumed,msg
 
 
-  def decode(self, buf=None, debug=False):
+  # bytes consumed by the arg_*() methods, for compile_table(). arg_strz has no fixed size.
+  arg_size = { arg_byte: 1, arg_perc: 2, arg_perc_f: 2, arg_abs: 5, arg_rel: 2, arg_color: 5 }
+
+  # the compiled rd_decoder_table per class and mode, see compile_table()
+  _dispatch = {}
+
+  @classmethod
+  def compile_entry(cls, c, mode=None):
+    """
+      Returns the entry c of the rd_decoder_table as a tuple
+        (name, method, args, note, size, need)
+      decode() calls method(self, *args), with the same arguments as
+      token_method() would. note is the description string c[3] or None.
+      size is the number of parameter bytes consumed, c[2] for the token
+      methods that decode their parameters. For commands that are only
+      skipped by t_skip_bytes() or t_cut_through_pow(), it follows the rules
+      of skip_msg(), and is None if it is not known in advance (arg_strz).
+      need is the number of bytes that must be available for the method,
+      skip_msg() wants c[2] even if it consumes less.
+      With mode 'geometry' or 'columns', the method of a skipped command is
+      None, as for commands without parameters: decode() then just advances
+      by size. Moves and cuts get their g_*() or c_*() method instead.
+    """
+    method = c[1] if len(c) > 1 else None
+    args = tuple(c[2:3])
+    note = None
+    if len(c) >= 4:
+      args += (c[3:],)
+      note = c[3]
+    size = None
+    if method is None:
+      size = 0
+    else:
+      size = c[2]
+      if method in (cls.t_skip_bytes, cls.t_cut_through_pow) and len(c) > 4:
+        # same rules as skip_msg()
+        size = 0
+        for arg in c[4:]:
+          if type(arg) == type(0): size += arg
+          elif arg in cls.arg_size: size += cls.arg_size[arg]
+          else: size = None; break
+    need = size
+    if size is not None and len(c) > 2: need = max(size, c[2])
+    if mode is not None:
+      fast = { 'geometry': cls.geometry_method, 'columns': cls.columns_method }[mode]
+      if method in (cls.t_skip_bytes, cls.t_cut_through_pow) and size is not None: method = None
+      if method in fast: method = fast[method]
+    return (c[0], method, args, note, size, need)
+
+  @classmethod
+  def compile_table(cls, mode=None):
+    """
+      Flattens the nested rd_decoder_table into a list of 256 entries,
+      indexed by the first byte of a command. A two byte command has a list
+      of 256 entries there, indexed by the second byte. Unknown commands are
+      None, the others tuples from compile_entry(). Compiled once per class
+      and mode, on first use.
+    """
+    if (cls, mode) in cls._dispatch: return cls._dispatch[(cls, mode)]
+    table = [None] * 256
+    for b0, tok in cls.rd_decoder_table.items():
+      if type(tok) == type({}):
+        sub = [None] * 256
+        for b1, c in tok.items(): sub[b1] = cls.compile_entry(c, mode)
+        table[b0] = sub
+      else:
+        table[b0] = cls.compile_entry(tok, mode)
+    cls._dispatch[(cls, mode)] = table
+    return table
+
+  def decode(self, buf=None, debug=False, geometry=False, columns=False):
     """
       Go through the buffer, byte by byte, and call token methods from the
       rd_decoder_table identified by either a one byte or a two byte token.
       For signature of the method calls see token_method()
       The contents of the buffer must already be unscambled.
+
+      The buffer is not copied. A cursor self._pos walks through a memoryview
+      of it, token methods read their arguments at self._pos. Without buf,
+      decoding continues at the cursor.
+
+      The table is used in the flat form of compile_table(). Messages are
+      only formatted with debug. geometry=True is the fast mode for paths,
+      layers and bounding boxes only: commands that do not change them are
+      skipped without looking at their parameters. columns=True is the same,
+      but the paths are collected in flat arrays, see columns().
     """
     debugfile = sys.stderr
     if debug not in (True, False):
         debug = True
         debugfile = sys.stdout
+    if debug and (geometry or columns):
+      raise ValueError("decode(%s=True) has no debug output" % ('columns' if columns else 'geometry'))
     if buf is not None:
+        self.close()          # a mapped file is replaced by buf
         self._buf = buf
-    pos = -1
-    while len(self._buf):
-      b0 = self._buf[0]
-      self._buf = self._buf[1:]
-      pos +=1
-      tok = self.rd_decoder_table.get(b0)
-
-      if tok:
-        if type(tok) == type({}):
-          # multi byte command
-          b1 = self._buf[0]
-          c = tok.get(b1)
-          if c:
-            self._buf = self._buf[1:]
-            pos +=1
-            out = "%5d: %02x %02x %s" % (pos, b0, b1, c[0])
-            consumed,msg = self.token_method(c)
-            if msg is not None: out += " " + msg;
-            if debug: print(out, file=debugfile)
-            self._buf = self._buf[consumed:]
-            pos += consumed
-
-          else:
-            if debug: print("%5d: %02x %02x second byte not defined in rd_dec" % (pos, b0, self._buf[0]), file=debugfile)
+        self._pos = 0
+    if columns:
+      table = self.compile_table('columns')
+      if self._xy is None:
+        self._xy = array.array('d')
+        self._offsets = array.array('l')
+        self._path_layer = array.array('l')
+    elif geometry:
+      table = self.compile_table('geometry')
+    else:
+      table = self.compile_table()
+    self._debug = debug
+    try:
+      if self._map is not None:
+        self.decode_mapped(table, debugfile=debugfile)
+      else:
+        if not isinstance(self._buf, memoryview): self._buf = memoryview(self._buf)
+        self.decode_commands(table, debugfile=debugfile)
+    finally:
+      self._debug = False
 
-        else:
-          # single byte command.
-          out = "%5d: %02x %s" % (pos, b0, tok[0])
+  # first bytes of all moves and cuts. The header ends before the first of them.
+  geometry_tokens = frozenset([0x88, 0x89, 0x8a, 0x8b, 0xa8, 0xa9, 0xaa, 0xab])
+
+  def decode_header(self):
+    """
+      Decode up to the first move or cut only, and return
+        { 'bbox': [xmin, ymin, xmax, ymax], 'layers': { n: { 'bbox':.., 'color':.., 'speed':.., ... } } }
+      With lazy=True, only the first window of the file is read. A later
+      decode() continues behind the header.
+    """
+    table = self.compile_table()
+    if self._map is not None:
+      self.decode_mapped(table, until=self.geometry_tokens)
+    else:
+      if not isinstance(self._buf, memoryview): self._buf = memoryview(self._buf)
+      self.decode_commands(table, until=self.geometry_tokens)
+    return { 'bbox': self._bbox, 'layers': self._layer }
+
+  def decode_mapped(self, table, debugfile=None, until=None, window=0x10000):
+    """
+      decode() for lazy=True. The mapped file is unscrambled one window of
+      window bytes at a time, only the pages touched are read. A command
+      cut by the end of a window is completed with the next one, as in
+      feed(). Returns True if decode_commands() stopped at until.
+    """
+    size = len(self._map)
+    while self._tail or self._mapoff < size:
+      chunk = self.unscramble_bytes(self._map[self._mapoff:self._mapoff+window])
+      self._mapoff += len(chunk)
+      final = self._mapoff >= size
+      self._buf = memoryview(self._tail + chunk if self._tail else chunk)
+      self._pos = 0
+      stop = self.decode_commands(table, debugfile=debugfile, final=final, origin=-self._fed, until=until)
+      self._tail = bytes(self._buf[self._pos:])
+      self._fed += self._pos
+      if stop: return True
+    return False
+
+  def feed(self, chunk, messages=True, final=False):
+    """
+      Incremental decode() of a stream of unscrambled chunks, e.g. the UDP
+      packets of a job, which may be cut anywhere, even inside a command.
+      Returns the list of commands completed by chunk, as events
+        (offset, data, name, msg)
+      offset: position of the command in the stream
+      data:   the bytes of the command, with parameters
+      name:   from rd_decoder_table, or None for bytes that are not a known
+              command. Those are skipped one by one, as in decode().
+      msg:    the decoded parameters, as in the output of decode(debug=True).
+              None without messages.
+
+      The paths, layers and bounding box are updated as with decode(). An
+      incomplete command at the end of chunk is kept, only that is joined
+      with the next chunk. With final=True, the stream ends with chunk, and
+      an incomplete command is decoded anyway, like decode() does.
+    """
+    if self._tail: chunk = self._tail + bytes(chunk)
+    self._buf = memoryview(chunk)
+    self._pos = 0
+    table = self.compile_table()
+    events = []
+    self._debug = messages
+    try:
+      self.decode_commands(table, events=events, final=final)
+    finally:
+      self._debug = False
+      self._tail = bytes(self._buf[self._pos:])
+      self._fed += self._pos
+    return events
+
+  def decode_commands(self, table, debugfile=None, events=None, final=True, origin=None, until=None):
+    """
+      The loop of decode() and feed(): decodes self._buf from the cursor
+      on, with a table from compile_table(). Without final, it stops before
+      an incomplete command at the end of the buffer. Messages are printed
+      to debugfile if self._debug, with positions relative to origin, default:
+      the cursor. Events are collected for feed().
+      Returns True, if it stopped before a command whose first byte is in until.
+    """
+    debug = self._debug
+    if debugfile is None: debug = False
+    buf = self._buf
+    end = len(buf)
+    pos = self._pos
+    if origin is None: origin = pos
+    stop = False
+    while pos < end:
+      cmd = pos
+      b0 = buf[pos]
+      if until is not None and b0 in until:
+        stop = True
+        break
+      pos += 1
+      e = table[b0]
+
+      if e is None:
+        if debug: print("%5d: %02x ERROR: ----------- token not found in rd_dec" % (pos-1-origin, b0), file=debugfile)
+        if events is not None: events.append((self._fed + cmd, bytes(buf[cmd:pos]), None, None))
+        continue
+
+      single = type(e) != type([])
+      if single:
+        if debug: out = "%5d: %02x %s" % (pos-1-origin, b0, e[0])
+      else:
+        # multi byte command
+        if pos == end and not final: pos = cmd; break
+        b1 = buf[pos]
+        if e[b1] is None:
+          if debug: print("%5d: %02x %02x second byte not defined in rd_dec" % (pos-1-origin, b0, b1), file=debugfile)
+          if events is not None: events.append((self._fed + cmd, bytes(buf[cmd:pos]), None, None))
+          continue
+        e = e[b1]
+        pos += 1
+        if debug: out = "%5d: %02x %02x %s" % (pos-1-origin, b0, b1, e[0])
+
+      method = e[1]
+      need = e[5]
+      if not final and (pos + need > end if need is not None else 0 not in buf[pos:]):
+        pos = cmd               # incomplete, wait for more.
+        break
+      if method is None:
+        consumed,msg = e[4], None
+      else:
+        self._pos = pos
+        if single:
           try:
-            consumed,msg = self.token_method(tok)
+            consumed,msg = method(self, *e[2])
           except:
-            print(out + "token_method failed", tok, file=debugfile)
-            consumed,msg = self.token_method(tok)
+            print("%5d: %02x %s" % (pos-1-origin, b0, e[0]) + "token_method failed", self.rd_decoder_table[b0], file=debugfile or sys.stderr)
+            raise
+        else:
+          consumed,msg = method(self, *e[2])
+      pos += consumed
 
-          if msg is not None: out += " " + msg;
-          if debug: print(out, file=debugfile)
-          self._buf = self._buf[consumed:]
-          pos += consumed
+      if self._debug and e[3] is not None:
+        if msg is None: msg = "(" + e[3] + ")"
+        else:           msg += " (" + e[3] + ")"
+      if debug:
+        if msg is not None: out += " " + msg;
+        print(out, file=debugfile)
+      if events is not None: events.append((self._fed + cmd, bytes(buf[cmd:pos]), e[0], msg))
+    self._pos = min(pos, end)
+    return stop
 
-      else:
-        if debug: print("%5d: %02x ERROR: ----------- token not found in rd_dec" % (pos, b0), file=debugfile)
+  def columns(self, um=False):
+    """
+      The paths as numpy arrays, for vectorized bounding boxes, odometers,
+      rendering or diffing:
+        { 'xy':      shape (N, 2), all vertices of all paths, in mm.
+                     With um=True as int32 micrometers.
+          'offsets': shape (P,), index into xy of the first vertex of each path,
+          'layer':   shape (P,), the layer number of each path,
+          'cut':     shape (N,), True for a vertex reached by a cut, False for moves }
+      Each move starts a path, the cuts that follow continue it.
+      After decode(columns=True), the arrays are copied from the flat arrays
+      collected there, otherwise they are built from the paths of decode().
+    """
+    if numpy is None: raise ImportError("RuidaParser.columns() needs numpy")
+    if self._xy is not None:
+      xy = numpy.array(self._xy, dtype=numpy.float64).reshape(-1, 2)
+      offsets = numpy.array(self._offsets, dtype=numpy.int64)
+      layer = numpy.array(self._path_layer, dtype=numpy.int64)
+    else:
+      paths = [p['data'] for p in self._paths]
+      count = numpy.fromiter((len(p) for p in paths), dtype=numpy.int64, count=len(paths))
+      offsets = numpy.cumsum(count) - count
+      chain = itertools.chain.from_iterable
+      xy = numpy.fromiter(chain(chain(paths)), dtype=numpy.float64, count=2*int(count.sum())).reshape(-1, 2)
+      layers = (p['layer']['n'] if type(p['layer']) == type({}) else p['layer'] for p in self._paths)
+      layer = numpy.fromiter(layers, dtype=numpy.int64, count=len(paths))
+    cut = numpy.ones(len(xy), dtype=bool)
+    cut[offsets[offsets < len(xy)]] = False
+    if um: xy = numpy.rint(xy * 1000).astype(numpy.int32)
+    return { 'xy': xy, 'offsets': offsets, 'layer': layer, 'cut': cut }
+
+  def path_array(self):
+    """ The paths as a RuidaPathArray of ruida.py, e.g. for its boundingbox() and odometer() """
+    from ruida import RuidaPathArray
+    c = self.columns()
+    return RuidaPathArray(c['xy'], c['offsets'])
 
   def svg_number(self, x):
     ## must not be scientific format.
@@ -593,33 +1070,85 @@ class RuidaParser():
     if n[-1] == '.': n = n[:-1]
     return n
 
-  def to_svg(self, stroke_width=1):
+  # trailing decimal zeros, and decimals that are all zero, of the numbers in an svg path, see svg_path()
+  svg_zeros = re.compile(r'(\.\d*?[1-9])0+(?= |$)')
+  svg_point = re.compile(r'\.0*(?= |$)')
+
+  def svg_decimate(self, flat, tolerance):
+    """
+      Preview decimation of one path, given as flat x, y, x, y, ... in mm:
+      of consecutive vertices in the same grid cell of size tolerance, only
+      the first is kept. The first and the last vertex are always kept.
+    """
+    s = 1.0 / tolerance
+    floor = math.floor
+    c = [floor(v * s) for v in flat]
+    keep = list(flat[0:2])
+    for i in range(2, len(flat)-2, 2):
+      if c[i] != c[i-2] or c[i+1] != c[i-1]: keep += flat[i:i+2]
+    if len(flat) > 2: keep += flat[-2:]
+    return keep
+
+  def svg_path(self, flat, precision=10, tolerance=None):
+    """
+      The d attribute of an svg path, given as flat x, y, x, y, ... in mm.
+      All numbers are formatted in one go, then stripped as svg_number() does.
+      A path that ends where it started is closed with "Z".
+    """
+    closed = len(flat) > 2 and flat[-2] == flat[0] and flat[-1] == flat[1]
+    if tolerance: flat = self.svg_decimate(flat, tolerance)
+    n = len(flat) // 2
+    xy = " %%.%df %%.%df" % (precision, precision)
+    if closed:
+      d = ("M" + xy + (" L" + xy) * (n-2)) % tuple(flat[:-2]) + " Z"
+    else:
+      d = ("M" + xy + (" L" + xy) * (n-1)) % tuple(flat)
+    return self.svg_point.sub('', self.svg_zeros.sub(r'\1', d))
+
+  def svg_paths(self):
+    """
+      Yields (flat, color) for each path: the vertices as flat x, y, x, y, ...
+      in mm, and the layer color or None. Works after decode(columns=True),
+      too, then the vertices are slices of the flat array.
+    """
+    if self._xy is not None:
+      xy = self._xy
+      ends = list(self._offsets[1:]) + [len(xy) // 2]
+      for start, end, prio in zip(self._offsets, ends, self._path_layer):
+        layer = self._layer.get(prio)
+        yield xy[2*start:2*end], (layer.get('color') if layer else None)
+      return
+    chain = itertools.chain.from_iterable
+    for path in self._paths:
+      layer = path.get('layer')
+      yield list(chain(path['data'])), (layer.get('color') if type(layer) == type({}) else None)
+
+  def write_svg(self, fd, stroke_width=1, precision=10, tolerance=None):
+    """
+      Writes the paths as an svg document to the file like object fd, one
+      path at a time, nothing else is kept in memory.
+      precision: decimals of the coordinates in mm, 3 is the micrometer
+                 resolution of the controller.
+      tolerance: preview decimation, see svg_decimate(). E.g. the size of a
+                 pixel in mm. Default: no decimation.
+    """
     w = self.svg_number(self._bbox[2]-self._bbox[0])
     h = self.svg_number(self._bbox[3]-self._bbox[1])
     x = self.svg_number(self._bbox[0])
     y = self.svg_number(self._bbox[1])
 
-    svg = '<svg xmlns="http://www.w3.org/2000/svg" viewBox="%s %s %s %s" width="%smm" height="%smm">' % (x,y,w,h,w,h)
+    fd.write('<svg xmlns="http://www.w3.org/2000/svg" viewBox="%s %s %s %s" width="%smm" height="%smm">\n' % (x,y,w,h,w,h))
+    for flat, color in self.svg_paths():
+      if not len(flat): continue
+      d = self.svg_path(flat, precision, tolerance)
+      fd.write('<path stroke="%s" stroke-width="%s" fill="none" d="%s"/>\n' % (color or "blue", stroke_width, d))
+    fd.write("</svg>\n")
 
-    elems = [svg]
-
-    for path in self._paths:
-      n = len(path['data'])
-      d = []
-      for i in range(n):
-        v = path['data'][i]
-        if i == 0:
-          d.append("M %s %s" % (self.svg_number(v[0]), self.svg_number(v[1])))
-        elif i > 0 and i == n-1 and v == path['data'][0]:
-          d.append("Z")
-        else:
-          d.append("L %s %s" % (self.svg_number(v[0]), self.svg_number(v[1])))
-      color="blue"
-      if path.get('layer') and path['layer'].get('color'):
-        color = path['layer']['color']
-      elems.append('<path stroke="%s" stroke-width="%s" fill="none" d="%s"/>' % (color, stroke_width, ' '.join(d)))
-    elems.append("</svg>")
-    return "\n".join(elems)
+  def to_svg(self, stroke_width=1, precision=10, tolerance=None):
+    """ write_svg() into a string, without the final newline """
+    fd = io.StringIO()
+    self.write_svg(fd, stroke_width, precision, tolerance)
+    return fd.getvalue()[:-1]
 
 if __name__ == '__main__':
   # load a .rd file
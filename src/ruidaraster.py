@@ -0,0 +1,161 @@
+#! /usr/bin/python3
+#
+# ruidaraster.py -- convert bitmap images into raster engraving scanlines.
+#
+# An image row becomes one scanline. Runs of ink pixels are cut with
+# Cut_Horiz, the gaps between them are crossed with Move_Horiz, rows are
+# changed with Move_Vert. Rows are engraved alternately left to right and
+# right to left, rows without ink are skipped, and each scanline only
+# spans the ink of its row, plus an overscan for acceleration.
+#
+# All positions are integer micrometers, so relative moves never drift.
+# Steps longer than a relative instruction can hold (8.191 mm) are split.
+#
+# Used by RuidaRasterLayer in ruida.py. Needs numpy.
+#
+# 2026-10-18, v1.0, agent:    Initial version.
+#
+# The code is fully compatible with python 2.7 and 3.5
+#
+
+try:
+  import numpy          # required. Everything here is vectorized.
+except ImportError:
+  numpy = None
+
+MAXREL = 8191           # longest relative step in micrometers, see Ruida.encode_relcoord()
+
+# 4x4 ordered dither matrix, see ink_mask()
+BAYER4 = [[ 0,  8,  2, 10],
+          [12,  4, 14,  6],
+          [ 3, 11,  1,  9],
+          [15,  7, 13,  5]]
+
+
+def ink_mask(image, threshold=128, dither=False):
+  """
+  Returns a boolean array, True where the laser should fire.
+
+  image is a 2D array, one value per pixel, the first row at the top.
+  A boolean image is used as is. Greyscale values (0 black .. 255 white)
+  below threshold are ink. With dither=True, greyscale is converted with
+  ordered dithering instead, so that grey areas are engraved as a pattern
+  of the matching density.
+  """
+  if numpy is None: raise ImportError("ruidaraster needs numpy")
+  image = numpy.asarray(image)
+  if image.ndim != 2: raise ValueError("image must be 2D, one value per pixel")
+  if image.dtype == bool: return image
+  if dither:
+    h, w = image.shape
+    bayer = (numpy.asarray(BAYER4, dtype=numpy.float64) + 0.5) * 16.0
+    limit = numpy.tile(bayer, ((h+3)//4, (w+3)//4))[:h, :w]
+    return image < limit
+  return image < threshold
+
+
+def scanlines(ink, dpi, origin=(0, 0), overscan=2.0, bidirectional=True):
+  """
+  Converts the ink mask into the scanline geometry of a raster engraving.
+
+  dpi is the image resolution, origin the position of the top left corner
+  of the image in mm, overscan the distance in mm that the head travels
+  beyond the ink on both ends of a scanline. Overscan positions are
+  clipped at 0, as absolute coordinates cannot be negative.
+
+  Returns (xy, offsets, bbox) with xy a numpy array of shape (N, 2) of
+  integer micrometers, offsets the index of each move in xy, as for a
+  RuidaPathStore, and bbox the bounding box of the ink in mm, or None if
+  there is none. Each move is a path of its own, a cut continues the path.
+  """
+  if numpy is None: raise ImportError("ruidaraster needs numpy")
+  ink = numpy.asarray(ink, dtype=bool)
+  pitch = 25400.0 / dpi                         # micrometers per pixel
+  ox = int(round(origin[0] * 1000))
+  oy = int(round(origin[1] * 1000))
+  ov = int(round(overscan * 1000))
+
+  rows = numpy.nonzero(ink.any(axis=1))[0]     # blank rows are skipped
+  if not len(rows):
+    return numpy.zeros((0, 2), dtype=numpy.int64), numpy.zeros(0, dtype=numpy.int64), None
+  used = ink.any(axis=0)                        # blank columns are trimmed
+  c0 = int(numpy.argmax(used))
+  c1 = len(used) - int(numpy.argmax(used[::-1]))
+  sub = ink[rows, c0:c1].astype(numpy.int8)
+
+  # runs of ink: +1 where a run starts, -1 behind its last pixel.
+  edge = numpy.diff(numpy.pad(sub, ((0, 0), (1, 1)), 'constant'), axis=1)
+  rank, cs = numpy.nonzero(edge == 1)          # rank: index into rows
+  ce = numpy.nonzero(edge == -1)[1]
+  xs = ox + numpy.round((c0 + cs) * pitch).astype(numpy.int64)
+  xe = ox + numpy.round((c0 + ce) * pitch).astype(numpy.int64)
+  ys = oy + numpy.round((rows + 0.5) * pitch).astype(numpy.int64)
+
+  nrows = len(rows)
+  rev = numpy.zeros(nrows, dtype=bool)
+  if bidirectional: rev[1::2] = True
+  rrev = rev[rank]
+  order = numpy.lexsort((numpy.where(rrev, -xs, xs), rank))
+  rank = rank[order]
+  xs = xs[order]
+  xe = xe[order]
+  rrev = rrev[order]
+  entry = numpy.where(rrev, xe, xs)
+  exit  = numpy.where(rrev, xs, xe)
+
+  count = numpy.bincount(rank, minlength=nrows)
+  first = numpy.cumsum(count) - count
+  last = first + count - 1
+  direction = numpy.where(rev, -1, 1)
+  leadin  = numpy.maximum(entry[first] - direction * ov, 0)
+  leadout = numpy.maximum(exit[last]   + direction * ov, 0)
+
+  # points of the sequence, sorted by (row rank, seq) below:
+  #  seq 0: vertical move from the previous leadout, 1: leadin,
+  #  2+2j, 3+2j: move to and cut along run j, 2+2*count: leadout.
+  #  Only the odd seq from 3 on are cuts.
+  j = numpy.arange(len(rank)) - first[rank]
+  r1 = numpy.arange(1, nrows)
+  allrows = numpy.arange(nrows)
+  X = numpy.concatenate([leadout[:-1], leadin,      entry,    exit,     leadout])
+  Y = numpy.concatenate([ys[1:],       ys,          ys[rank], ys[rank], ys])
+  R = numpy.concatenate([r1,           allrows,     rank,     rank,     allrows])
+  S = numpy.concatenate([0*r1,         0*allrows+1, 2+2*j,    3+2*j,    2+2*count])
+  order = numpy.lexsort((S, R))
+  X = X[order]
+  Y = Y[order]
+  S = S[order]
+  move = (S % 2 == 0) | (S == 1)
+
+  # moves that go nowhere are dropped, e.g. the leadin without overscan.
+  keep = numpy.ones(len(X), dtype=bool)
+  keep[1:] = ~move[1:] | (X[1:] != X[:-1]) | (Y[1:] != Y[:-1])
+  X = X[keep]
+  Y = Y[keep]
+  move = move[keep]
+
+  # split steps longer than MAXREL into equal parts, all steps are axis parallel.
+  dx = numpy.diff(X, prepend=X[0])
+  dy = numpy.diff(Y, prepend=Y[0])
+  parts = numpy.maximum((numpy.maximum(numpy.abs(dx), numpy.abs(dy)) + MAXREL - 1) // MAXREL, 1)
+  if (parts > 1).any():
+    idx = numpy.repeat(numpy.arange(len(X)), parts)
+    t = numpy.arange(len(idx)) - numpy.repeat(numpy.cumsum(parts) - parts, parts) + 1
+    k = parts[idx]
+    X = X[idx] - dx[idx] + (dx[idx] * t) // k
+    Y = Y[idx] - dy[idx] + (dy[idx] * t) // k
+    move = move[idx]
+
+  bbox = [[int(xs.min()) / 1000.0, int(ys[0]) / 1000.0], [int(xe.max()) / 1000.0, int(ys[-1]) / 1000.0]]
+  return numpy.stack([X, Y], axis=1), numpy.nonzero(move)[0], bbox
+
+
+if __name__ == '__main__':
+  # self test: a ring, one pixel per mm.
+  yy, xx = numpy.mgrid[0:40, 0:40]
+  ring = numpy.abs(numpy.hypot(xx-20, yy-20) - 12) < 3
+  xy, offsets, bbox = scanlines(ring, 25.4, origin=(5, 5))
+  steps = numpy.abs(numpy.diff(xy, axis=0))
+  if steps.max() > MAXREL: raise ValueError("step too long")
+  if (steps.min(axis=1) != 0).any(): raise ValueError("step not axis parallel")
+  print("%d rows, %d points, %d moves, bbox %s" % (ring.any(axis=1).sum(), len(xy), len(offsets), bbox))
@@ -0,0 +1,432 @@
+#! /usr/bin/python3
+#
+# svg2rd.py -- convert an SVG drawing into a Ruida *.rd file.
+#
+# The SVG is read incrementally with iterparse(). Each shape is converted
+# to polylines in mm as soon as its element is complete, then the element
+# is dropped. Memory use is bounded by the flattened geometry, which is
+# kept per layer in a compact RuidaPathStore, not by the XML document.
+#
+# Curves are flattened adaptively: Bezier segments are subdivided until
+# their control points are within tolerance of the chord, arcs, circles and
+# ellipses get an angle step that keeps the chord error below tolerance.
+# Gentle curves get few segments, tight ones as many as they need.
+#
+# Each stroke colour becomes a layer with that colour, in order of first
+# appearance. Shapes without stroke use their fill colour. Shapes with a colour
+# that cannot be parsed (currentColor, gradients, hsl(), unknown names) are
+# skipped with a warning, rather than cut with the settings of another layer.
+#
+# Usage: python3 svg2rd.py [-t TOL] [-s SPEED] [-p MIN,MAX] [-O] FILE.svg [OUT.rd]
+# Self test: python3 -m doctest svg2rd.py
+#
+# Supported: path (all commands), line, polyline, polygon, rect, circle, ellipse,
+# nested groups with transforms, width/height/viewBox of the root element.
+# Not supported: use, text, images, clipping, rounded rect corners.
+#
+# 2026-10-18, v1.0, agent:    Initial version.
+#
+# The code is fully compatible with python 2.7 and 3.5
+#
+from __future__ import print_function
+import sys, re, math, argparse
+import xml.etree.ElementTree as ET
+from ruida import Ruida, RuidaPathStore
+
+__version__ = "1.0"
+
+# mm per unit
+UNITS = { 'mm':1.0, 'cm':10.0, 'in':25.4, 'pt':25.4/72, 'pc':25.4/6, 'px':25.4/96, '':25.4/96 }
+
+COLORS = { 'black':(0,0,0), 'white':(255,255,255), 'red':(255,0,0), 'lime':(0,255,0),
+           'green':(0,128,0), 'blue':(0,0,255), 'yellow':(255,255,0), 'cyan':(0,255,255),
+           'magenta':(255,0,255), 'gray':(128,128,128), 'grey':(128,128,128),
+           'orange':(255,165,0), 'purple':(128,0,128) }
+
+# elements, whose content is never drawn directly.
+SKIP = set(['defs', 'clipPath', 'mask', 'marker', 'pattern', 'symbol', 'metadata', 'title', 'desc', 'style', 'script'])
+
+IDENTITY = (1.0, 0.0, 0.0, 1.0, 0.0, 0.0)
+
+re_number = re.compile(r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?')
+re_path_token = re.compile(r'([MmZzLlHhVvCcSsQqTtAa])|([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)')
+re_transform = re.compile(r'(matrix|translate|scale|rotate|skewX|skewY)\s*\(([^)]*)\)')
+
+
+def multiply(m, n):
+  """ affine matrices (a, b, c, d, e, f) as in SVG: m applied after n """
+  a, b, c, d, e, f = m
+  A, B, C, D, E, F = n
+  return (a*A + c*B, b*A + d*B, a*C + c*D, b*C + d*D, a*E + c*F + e, b*E + d*F + f)
+
+def apply(m, x, y):
+  return (m[0]*x + m[2]*y + m[4], m[1]*x + m[3]*y + m[5])
+
+def max_scale(m):
+  """ largest factor by which m stretches a distance """
+  s = m[0]*m[0] + m[1]*m[1] + m[2]*m[2] + m[3]*m[3]
+  det = m[0]*m[3] - m[1]*m[2]
+  return math.sqrt((s + math.sqrt(max(s*s - 4*det*det, 0))) / 2)
+
+def parse_transform(text):
+  m = IDENTITY
+  for name, args in re_transform.findall(text or ''):
+    v = [float(x) for x in re_number.findall(args)]
+    if name == 'matrix' and len(v) == 6: t = tuple(v)
+    elif name == 'translate': t = (1, 0, 0, 1, v[0], v[1] if len(v) > 1 else 0)
+    elif name == 'scale': t = (v[0], 0, 0, v[1] if len(v) > 1 else v[0], 0, 0)
+    elif name == 'rotate':
+      a = math.radians(v[0])
+      t = (math.cos(a), math.sin(a), -math.sin(a), math.cos(a), 0, 0)
+      if len(v) == 3: t = multiply((1, 0, 0, 1, v[1], v[2]), multiply(t, (1, 0, 0, 1, -v[1], -v[2])))
+    elif name == 'skewX': t = (1, 0, math.tan(math.radians(v[0])), 1, 0, 0)
+    elif name == 'skewY': t = (1, math.tan(math.radians(v[0])), 0, 1, 0, 0)
+    else: raise ValueError("bad transform: " + name + "(" + args + ")")
+    m = multiply(m, t)
+  return m
+
+def parse_length(text, default=None):
+  """ returns (value, unit) """
+  if text is None: return (default, '')
+  m = re.match(r'\s*([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)\s*([a-z%]*)', text)
+  if not m: return (default, '')
+  return (float(m.group(1)), m.group(2))
+
+def parse_color(text):
+  """
+  returns (r, g, b), or None for 'none'. Raises ValueError for colours
+  that are not understood.
+
+  >>> parse_color('#F00'), parse_color('rgb(0, 128, 255)'), parse_color('Blue'), parse_color('none')
+  ((255, 0, 0), (0, 128, 255), (0, 0, 255), None)
+  >>> parse_color('currentColor')
+  Traceback (most recent call last):
+  ValueError: unknown colour: currentColor
+  """
+  name = text.strip().lower()
+  if name in ('none', 'transparent', ''): return None
+  if re.match(r'#([0-9a-f]{3}){1,2}$', name):
+    h = name[1:]
+    if len(h) == 3: h = h[0]*2 + h[1]*2 + h[2]*2
+    return (int(h[0:2], 16), int(h[2:4], 16), int(h[4:6], 16))
+  v = re_number.findall(name)
+  if re.match(r'rgba?\(', name) and len(v) >= 3:
+    if '%' in name: return tuple([int(round(float(x) * 2.55)) for x in v[:3]])
+    return tuple([int(float(x)) for x in v[:3]])
+  if name in COLORS: return COLORS[name]
+  raise ValueError("unknown colour: " + text.strip())
+
+def style_of(elem, inherited):
+  """ the presentation attributes we care about, with inheritance """
+  style = dict(inherited)
+  for key in ('stroke', 'fill', 'display', 'visibility'):
+    if key in elem.attrib: style[key] = elem.attrib[key]
+  for decl in elem.attrib.get('style', '').split(';'):
+    if ':' in decl:
+      key, value = decl.split(':', 1)
+      key = key.strip()
+      if key in ('stroke', 'fill', 'display', 'visibility'): style[key] = value.strip()
+  return style
+
+
+class Flattener():
+  """
+  Converts shapes in user units into polylines in mm, with the chord error
+  below tolerance mm. m is the current transformation matrix (user units to mm).
+  """
+  def __init__(self, tolerance=0.025):
+    self.tolerance = tolerance
+
+  def cubic(self, m, p0, p1, p2, p3, out):
+    """ append the flattened cubic Bezier to out. p0 is already there. """
+    tol2 = self.tolerance * self.tolerance
+    stack = [(apply(m, *p0), apply(m, *p1), apply(m, *p2), apply(m, *p3), 0)]
+    while stack:
+      a, b, c, d, depth = stack.pop()
+      # the curve is within the hull of its control points, thus within
+      # the larger distance of b and c from the chord segment a-d.
+      dx = d[0] - a[0]
+      dy = d[1] - a[1]
+      l2 = dx*dx + dy*dy
+      flat = True
+      for p in (b, c):
+        t = 0.0
+        if l2 > 0: t = min(1.0, max(0.0, ((p[0]-a[0])*dx + (p[1]-a[1])*dy) / l2))
+        ex = p[0] - a[0] - t*dx
+        ey = p[1] - a[1] - t*dy
+        if ex*ex + ey*ey > tol2: flat = False
+      if flat or depth >= 18:
+        out.append([d[0], d[1]])
+        continue
+      # de Casteljau at t=0.5, the second half is pushed first to pop last.
+      ab = ((a[0]+b[0])/2, (a[1]+b[1])/2)
+      bc = ((b[0]+c[0])/2, (b[1]+c[1])/2)
+      cd = ((c[0]+d[0])/2, (c[1]+d[1])/2)
+      abc = ((ab[0]+bc[0])/2, (ab[1]+bc[1])/2)
+      bcd = ((bc[0]+cd[0])/2, (bc[1]+cd[1])/2)
+      mid = ((abc[0]+bcd[0])/2, (abc[1]+bcd[1])/2)
+      stack.append((mid, bcd, cd, d, depth+1))
+      stack.append((a, ab, abc, mid, depth+1))
+
+  def quadratic(self, m, p0, p1, p2, out):
+    c1 = (p0[0] + 2.0/3*(p1[0]-p0[0]), p0[1] + 2.0/3*(p1[1]-p0[1]))
+    c2 = (p2[0] + 2.0/3*(p1[0]-p2[0]), p2[1] + 2.0/3*(p1[1]-p2[1]))
+    self.cubic(m, p0, c1, c2, p2, out)
+
+  def ellipse_arc(self, m, cx, cy, rx, ry, phi, theta, dtheta, out):
+    """
+    append points of the elliptic arc from angle theta by dtheta (radians),
+    the start point is already there.
+    """
+    r = max(rx, ry) * max_scale(m)
+    if r <= self.tolerance: step = math.pi / 2
+    else: step = 2 * math.acos(1 - self.tolerance / r)
+    n = max(int(math.ceil(abs(dtheta) / step)), 1)
+    cp = math.cos(phi)
+    sp = math.sin(phi)
+    for i in range(1, n+1):
+      t = theta + dtheta * i / n
+      x = rx * math.cos(t)
+      y = ry * math.sin(t)
+      out.append(list(apply(m, cx + cp*x - sp*y, cy + sp*x + cp*y)))
+
+  def arc(self, m, p0, rx, ry, phi_deg, large, sweep, p1, out):
+    """ SVG endpoint arc, see SVG 1.1 appendix F.6.5 """
+    rx = abs(rx)
+    ry = abs(ry)
+    if rx == 0 or ry == 0 or p0 == p1:
+      out.append(list(apply(m, *p1)))
+      return
+    phi = math.radians(phi_deg)
+    cp = math.cos(phi)
+    sp = math.sin(phi)
+    dx = (p0[0] - p1[0]) / 2
+    dy = (p0[1] - p1[1]) / 2
+    x1 = cp*dx + sp*dy
+    y1 = -sp*dx + cp*dy
+    lam = (x1*x1)/(rx*rx) + (y1*y1)/(ry*ry)
+    if lam > 1:
+      rx *= math.sqrt(lam)
+      ry *= math.sqrt(lam)
+    num = rx*rx*ry*ry - rx*rx*y1*y1 - ry*ry*x1*x1
+    den = rx*rx*y1*y1 + ry*ry*x1*x1
+    k = math.sqrt(max(num, 0) / den)
+    if large == sweep: k = -k
+    cx1 = k * rx * y1 / ry
+    cy1 = -k * ry * x1 / rx
+    cx = cp*cx1 - sp*cy1 + (p0[0] + p1[0]) / 2
+    cy = sp*cx1 + cp*cy1 + (p0[1] + p1[1]) / 2
+    theta = math.atan2((y1 - cy1) / ry, (x1 - cx1) / rx)
+    theta2 = math.atan2((-y1 - cy1) / ry, (-x1 - cx1) / rx)
+    dtheta = theta2 - theta
+    if sweep and dtheta < 0: dtheta += 2*math.pi
+    if not sweep and dtheta > 0: dtheta -= 2*math.pi
+    self.ellipse_arc(m, cx, cy, rx, ry, phi, theta, dtheta, out)
+    out[-1] = list(apply(m, *p1))       # exactly at the end point
+
+  def path(self, m, d):
+    """ returns the subpaths of an SVG path d attribute as lists of [x, y] in mm """
+    tokens = re_path_token.findall(d)
+    paths = []
+    out = None
+    cmd = None
+    i = 0
+    cur = start = (0.0, 0.0)
+    last_ctrl = None            # for S and T: (command letter, control point)
+
+    while i < len(tokens):
+      if tokens[i][0]:
+        cmd = tokens[i][0]
+        i += 1
+        if cmd in 'Zz':
+          if out is not None:
+            if out[-1] != out[0]: out.append(list(out[0]))
+            paths.append(out)
+            out = None
+          cur = start
+          last_ctrl = None
+          continue
+      elif cmd is None:
+        raise ValueError("path data must start with a command: " + d[:40])
+      rel = cmd.islower()
+      C = cmd.upper()
+      ox, oy = cur if rel else (0.0, 0.0)
+      n = { 'M':2, 'L':2, 'H':1, 'V':1, 'C':6, 'S':4, 'Q':4, 'T':2, 'A':7 }[C]
+      if i + n > len(tokens) or any([tokens[k][0] for k in range(i, i+n)]): raise ValueError("path data truncated: " + d[:40])
+      v = [float(tokens[k][1]) for k in range(i, i+n)]
+      i += n
+      if C == 'M':
+        if out is not None and len(out) > 1: paths.append(out)
+        cur = start = (ox + v[0], oy + v[1])
+        out = [list(apply(m, *cur))]
+        cmd = 'l' if rel else 'L'         # implicit lineto for further pairs
+        last_ctrl = None
+        continue
+      if out is None: out = [list(apply(m, *cur))]
+      ctrl = None
+      if C == 'L':
+        cur = (ox + v[0], oy + v[1])
+        out.append(list(apply(m, *cur)))
+      elif C == 'H':
+        cur = (ox + v[0], cur[1])
+        out.append(list(apply(m, *cur)))
+      elif C == 'V':
+        cur = (cur[0], (cur[1] if rel else 0.0) + v[0])
+        out.append(list(apply(m, *cur)))
+      elif C in 'CS':
+        if C == 'C':
+          c1 = (ox + v[0], oy + v[1])
+          v = v[2:]
+        elif last_ctrl and last_ctrl[0] == 'C':
+          c1 = (2*cur[0] - last_ctrl[1][0], 2*cur[1] - last_ctrl[1][1])
+        else:
+          c1 = cur
+        c2 = (ox + v[0], oy + v[1])
+        end = (ox + v[2], oy + v[3])
+        self.cubic(m, cur, c1, c2, end, out)
+        ctrl = ('C', c2)
+        cur = end
+      elif C in 'QT':
+        if C == 'Q':
+          c1 = (ox + v[0], oy + v[1])
+          v = v[2:]
+        elif last_ctrl and last_ctrl[0] == 'Q':
+          c1 = (2*cur[0] - last_ctrl[1][0], 2*cur[1] - last_ctrl[1][1])
+        else:
+          c1 = cur
+        end = (ox + v[0], oy + v[1])
+        self.quadratic(m, cur, c1, end, out)
+        ctrl = ('Q', c1)
+        cur = end
+      elif C == 'A':
+        end = (ox + v[5], oy + v[6])
+        self.arc(m, cur, v[0], v[1], v[2], v[3] != 0, v[4] != 0, end, out)
+        cur = end
+      last_ctrl = ctrl
+    if out is not None and len(out) > 1: paths.append(out)
+    return paths
+
+  def shape(self, m, tag, a):
+    """ returns the subpaths of a basic shape element with attributes a """
+    f = lambda key: float(a.get(key, 0) or 0)
+    if tag == 'path': return self.path(m, a.get('d', ''))
+    if tag == 'line':
+      return [[list(apply(m, f('x1'), f('y1'))), list(apply(m, f('x2'), f('y2')))]]
+    if tag in ('polyline', 'polygon'):
+      v = [float(x) for x in re_number.findall(a.get('points', ''))]
+      out = [list(apply(m, v[k], v[k+1])) for k in range(0, len(v)-1, 2)]
+      if tag == 'polygon' and out and out[-1] != out[0]: out.append(list(out[0]))
+      return [out] if len(out) > 1 else []
+    if tag == 'rect':
+      x, y, w, h = f('x'), f('y'), f('width'), f('height')
+      if w <= 0 or h <= 0: return []
+      return [[list(apply(m, *p)) for p in ((x, y), (x+w, y), (x+w, y+h), (x, y+h), (x, y))]]
+    if tag in ('circle', 'ellipse'):
+      cx, cy = f('cx'), f('cy')
+      if tag == 'circle': rx = ry = f('r')
+      else: rx, ry = f('rx'), f('ry')
+      if rx <= 0 or ry <= 0: return []
+      out = [list(apply(m, cx + rx, cy))]
+      self.ellipse_arc(m, cx, cy, rx, ry, 0.0, 0.0, 2*math.pi, out)
+      out[-1] = list(out[0])
+      return [out]
+    return []
+
+
+def svg_paths(source, tolerance=0.025):
+  """
+  Generator: parses the SVG file (name or file object) incrementally and
+  yields (color, path) for each polyline, with color an (r, g, b) tuple and
+  path a list of [x, y] in mm. Elements are dropped as soon as they are done.
+  Elements with an unknown colour are skipped, with one warning per colour
+  on stderr.
+
+  >>> import io
+  >>> svg = io.BytesIO(b'<svg xmlns="http://www.w3.org/2000/svg" width="10mm" height="10mm" viewBox="0 0 10 10">'
+  ...   b'<line x2="5" stroke="red"/><line x2="6" stroke="currentColor"/><line x2="7" stroke="bleu"/></svg>')
+  >>> list(svg_paths(svg))
+  [((255, 0, 0), [[0.0, 0.0], [5.0, 0.0]])]
+  """
+  flat = Flattener(tolerance)
+  unknown = set()             # colours already warned about
+  stack = []                  # (element, matrix, style, skip) of the open elements
+  for event, elem in ET.iterparse(source, events=('start', 'end')):
+    tag = elem.tag.split('}')[-1]
+    if event == 'start':
+      if stack:
+        parent_m, parent_style, skip = stack[-1][1], stack[-1][2], stack[-1][3]
+      else:
+        # root element: map the viewBox onto width and height.
+        w, wu = parse_length(elem.get('width'))
+        h, hu = parse_length(elem.get('height'))
+        vb = [float(x) for x in re_number.findall(elem.get('viewBox', ''))]
+        sx = sy = UNITS.get(wu, UNITS['px'])
+        tx = ty = 0.0
+        if len(vb) == 4 and vb[2] > 0 and vb[3] > 0:
+          if w is not None: sx = w * UNITS.get(wu, UNITS['px']) / vb[2]
+          if h is not None: sy = h * UNITS.get(hu, UNITS['px']) / vb[3]
+          if w is None: sx = sy
+          if h is None: sy = sx
+          tx = -vb[0] * sx
+          ty = -vb[1] * sy
+        parent_m, parent_style, skip = (sx, 0.0, 0.0, sy, tx, ty), { 'fill':'black' }, False
+      style = style_of(elem, parent_style)
+      m = multiply(parent_m, parse_transform(elem.get('transform')))
+      skip = skip or tag in SKIP or style.get('display') == 'none' or style.get('visibility') == 'hidden'
+      stack.append((elem, m, style, skip))
+      continue
+
+    e, m, style, skip = stack.pop()
+    if not skip:
+      try:
+        color = parse_color(style.get('stroke', 'none'))
+        if color is None: color = parse_color(style.get('fill', 'none'))
+      except ValueError as e:
+        if str(e) not in unknown: print("svg2rd: %s, skipped" % e, file=sys.stderr)
+        unknown.add(str(e))
+        color = None
+      if color is not None:
+        for path in flat.shape(m, tag, elem.attrib):
+          yield color, path
+    elem.clear()
+    if stack: stack[-1][0].remove(elem)      # keep no finished elements in memory
+
+
+def svg2rd(source, tolerance=0.025, speed=30, power=[50, 70], rd=None):
+  """
+  Returns a Ruida object with one layer per colour, its paths in RuidaPathStores.
+  """
+  if rd is None: rd = Ruida()
+  colors = []                 # layer order
+  stores = {}
+  for color, path in svg_paths(source, tolerance):
+    if color not in stores:
+      colors.append(color)
+      stores[color] = RuidaPathStore()
+      rd.set(layer=len(colors)-1, color=list(color), speed=speed, power=power)
+    stores[color].append(path)
+  for lnum, color in enumerate(colors):
+    rd.set(layer=lnum, paths=stores[color])
+  return rd
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='Convert an SVG drawing into a Ruida .rd file. Version ' + __version__)
+  parser.add_argument('-t', '--tolerance', type=float, default=0.025, help='maximum chord error of flattened curves in mm, default 0.025, a quarter of the beam')
+  parser.add_argument('-s', '--speed', type=float, default=30, help='cutting speed in mm/s, default 30')
+  parser.add_argument('-p', '--power', default='50,70', help='min,max laser power in percent, default 50,70')
+  parser.add_argument('-O', '--optimize', action='store_true', help='reorder paths to reduce travel moves')
+  parser.add_argument('svgfile')
+  parser.add_argument('rdfile', nargs='?', help='default: svgfile with .rd suffix')
+  args = parser.parse_args()
+
+  power = [float(x) for x in args.power.split(',')]
+  if len(power) == 1: power = power * 2
+  rd = svg2rd(args.svgfile, args.tolerance, args.speed, power)
+  if not rd._layers: raise ValueError("no shapes found in " + args.svgfile)
+  if args.optimize: rd.set(optimize=True)
+  out = args.rdfile or re.sub(r'\.svg$', '', args.svgfile, flags=re.I) + '.rd'
+  with open(out, 'wb') as fd:
+    rd.write(fd)
+  n = sum([l.stats().vertices for l in rd._layers])
+  print("%s: %d layers, %d vertices, odometer %s" % (out, len(rd._layers), n, rd._odo))
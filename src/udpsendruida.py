@@ -24,22 +24,14 @@
 #
 # test against:
 # ncat -l -u -v 50200
+#
+# The RuidaUdp class can also be imported. write_chunks() sends a job directly from
+# Ruida.write_iter() without assembling the file in memory:
+#   RuidaUdp(host).write_chunks(rd.write_iter())
 
 import os, sys, time
 from socket import *
 
-if sys.version_info.major < 3:
-  print("Need python3 for "+sys.argv[0])
-  sys.exit(1)
-
-if len(sys.argv) < 3:
-  print("Usage: %s IPADDR FILE.rd" % sys.argv[0])
-  sys.exit(1)
-
-host=sys.argv[1]
-file=sys.argv[2]
-
-
 class RuidaUdp():
   NETWORK_TIMEOUT = 3000
   INADDR_ANY_DOTTED = '0.0.0.0'  # bind to all interfaces.
@@ -65,16 +57,26 @@ class RuidaUdp():
     return bytes([b0,b1])
 
   def write(self, data):
-    start = 0
-    l = len(data)
-    while start < l:
-      chunk_sz = l - start
-      if chunk_sz > self.MTU:
-        chunk_sz = self.MTU
-      chksum = self._checksum(data, start, chunk_sz)
-      buf = chksum + data[start:start+chunk_sz]
-      self.send(buf, retry=(start == 0))
-      start += chunk_sz
+    self.write_chunks([data])
+
+  def write_chunks(self, chunks):
+    """
+    Send an iterable of (scrambled) data chunks, e.g. from Ruida.write_iter().
+    The chunk sizes do not matter, the data is repacked into datagrams of MTU
+    payload bytes. Only the first datagram is retried.
+    """
+    pending = bytearray()
+    first = True
+    for chunk in chunks:
+      pending += chunk
+      start = 0
+      while len(pending) - start >= self.MTU:
+        self.send(self._checksum(pending, start, self.MTU) + bytes(pending[start:start+self.MTU]), retry=first)
+        first = False
+        start += self.MTU
+      del pending[:start]
+    if len(pending):
+      self.send(self._checksum(pending, 0, len(pending)) + bytes(pending), retry=first)
 
   def send(self, ary, retry=False):
     if self.chunkpause > 0.0:
@@ -109,6 +111,18 @@ class RuidaUdp():
         break
 
 
-laser = RuidaUdp(host)
-rdfile = open(file, 'rb').read()
-laser.write(rdfile)
+if __name__ == '__main__':
+  if sys.version_info.major < 3:
+    print("Need python3 for "+sys.argv[0])
+    sys.exit(1)
+
+  if len(sys.argv) < 3:
+    print("Usage: %s IPADDR FILE.rd" % sys.argv[0])
+    sys.exit(1)
+
+  host=sys.argv[1]
+  file=sys.argv[2]
+
+  laser = RuidaUdp(host)
+  with open(file, 'rb') as fd:
+    laser.write_chunks(iter(lambda: fd.read(0x10000), b''))